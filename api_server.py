@@ -0,0 +1,28 @@
+# Standalone API server for running the web app apart from the checker (`python main.py --checker-only`).
+# Both share the SQLite database; progress events reach the browsers through it.
+#
+#     gunicorn -w 1 --threads 200 -b 0.0.0.0:5000 api_server:app
+#     python api_server.py  # single process, e.g. on Windows
+#
+# Socket.IO long-polling needs sticky sessions with several workers, so the /stat page uses websockets.
+# Every open websocket holds one gunicorn thread, so workers * threads bounds the live /stat clients.
+# Each worker keeps its own metrics and /metrics shows the worker that answered it, so the default is
+# a single worker; more workers make the scraped counters jump between scrapes.
+import logging
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from config_manager import load_config
+from web_app import create_app
+
+config = load_config()
+# Threading mode matches gunicorn's gthread workers, which serve websockets through simple-websocket
+app, socketio = create_app(config, forward_events=True, async_mode='threading')
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    web = config.get('web', {})
+    # Werkzeug development server; use gunicorn for production
+    socketio.run(app, host=web.get('host', '0.0.0.0'), port=web.get('port', 5000), allow_unsafe_werkzeug=True)
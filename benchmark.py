@@ -0,0 +1,350 @@
+# Offline benchmarks for the checker, the scraper and the database. A fake proxy farm
+# (HTTP/CONNECT/SOCKS4/SOCKS5), the built-in judge used as test_url and canned proxy-list pages
+# run in a separate process, so no network access is needed:
+#
+#     python benchmark.py checker --sizes 1000 10000 --workers 200
+#     python benchmark.py all --failure-rate 0.7 --blackhole-rate 0.1
+#
+# Fake proxies listen on 0.0.0.0 so that every 127.x.y.z address reaches them; each
+# candidate's behaviour (dead, blackhole, slow body, working) is derived from its address.
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Dict, Any, Union
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.append(str(Path(__file__).parent))
+
+from judge import handle_request
+
+
+class NullSocketIO:
+    def emit(self, *args, **kwargs) -> None:
+        pass
+
+
+def candidate_address(index: int, ports: List[int]) -> Dict[str, Any]:
+    # Spread candidates over 127.0.0.0/8 so the farm can tell them apart by destination address
+    host, low = divmod(index // len(ports), 254)
+    return {
+        'ip_address': f"127.{(host >> 8) & 0xFF}.{host & 0xFF}.{low + 1}",
+        'port': ports[index % len(ports)]
+    }
+
+
+def echo_body(origin: str) -> bytes:
+    return json.dumps({'origin': origin}).encode()
+
+
+def http_response(status: int, body: bytes) -> bytes:
+    return (f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n").encode() + body
+
+
+class FakeProxyFarm:
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+
+    def _behaviour(self, ip: str, port: int) -> str:
+        score = zlib.crc32(f"{ip}:{port}".encode()) % 10000 / 10000
+        for name in ('failure', 'blackhole', 'slow'):
+            score -= self.options[f"{name}_rate"]
+            if score < 0:
+                return name
+        return 'working'
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        ip, port = writer.get_extra_info('sockname')[:2]
+        behaviour = self._behaviour(ip, port)
+        try:
+            if behaviour == 'failure':
+                return
+            if behaviour == 'blackhole':
+                await asyncio.sleep(3600)
+                return
+            first = await reader.readexactly(1)
+            if first == b"\x05":
+                methods = await reader.readexactly(1)
+                await reader.readexactly(methods[0])
+                writer.write(b"\x05\x00")
+                header = await reader.readexactly(4)
+                if header[3] == 0x03:
+                    await reader.readexactly((await reader.readexactly(1))[0])
+                else:
+                    await reader.readexactly(4 if header[3] == 0x01 else 16)
+                await reader.readexactly(2)
+                writer.write(b"\x05\x00\x00\x01" + bytes(6))
+                await reader.readuntil(b"\r\n\r\n")
+            elif first == b"\x04":
+                await reader.readexactly(7)
+                await reader.readuntil(b"\x00")
+                writer.write(b"\x00\x5a" + bytes(6))
+                await reader.readuntil(b"\r\n\r\n")
+            else:
+                head = first + await reader.readuntil(b"\r\n\r\n")
+                if head.startswith(b"CONNECT "):
+                    writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+                    await reader.readuntil(b"\r\n\r\n")
+
+            await asyncio.sleep(self.options['latency_ms'] / 1000)
+            response = http_response(200, echo_body(self.options['origin']))
+            if behaviour == 'slow':
+                # Trickle the body so the check is dominated by the transfer, not the connect
+                for i in range(0, len(response), 8):
+                    writer.write(response[i:i + 8])
+                    await writer.drain()
+                    await asyncio.sleep(self.options['slow_chunk_ms'] / 1000)
+            else:
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _pages(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            path = head.split(b" ", 2)[1].decode()
+            rows = self.options['rows_per_page']
+            page = int(path.rsplit('/', 1)[-1].split('.')[0] or 0)
+            addresses = [candidate_address(page * rows + i, [8080]) for i in range(rows)]
+            if path.endswith('.txt'):
+                body = "\n".join(f"{a['ip_address']}:{a['port']}" for a in addresses).encode()
+            else:
+                body = ("<html><body><table><tr><th>IP</th><th>Port</th></tr>" + "".join(
+                    f"<tr><td>{a['ip_address']}</td><td>{a['port']}</td><td>HTTP</td></tr>" for a in addresses
+                ) + "</table></body></html>").encode()
+            await asyncio.sleep(self.options['latency_ms'] / 1000)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n"
+                         + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, ready) -> None:
+        servers = [await asyncio.start_server(self._handle, '0.0.0.0', port, backlog=4096)
+                   for port in self.options['proxy_ports']]
+        servers.append(await asyncio.start_server(handle_request, '127.0.0.1', self.options['echo_port'], backlog=4096))
+        servers.append(await asyncio.start_server(self._pages, '127.0.0.1', self.options['pages_port'], backlog=1024))
+        ready.set()
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+def run_farm(options: Dict[str, Any], ready) -> None:
+    asyncio.run(FakeProxyFarm(options).serve(ready))
+
+
+def peak_rss_mb() -> Union[float, str]:
+    if resource is None:
+        return 'n/a'
+    # ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench_checker(size: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    from database import ProxyDatabase
+    from proxy_checker import ProxyChecker
+
+    latencies: List[float] = []
+
+    class TimedChecker(ProxyChecker):
+        async def check_proxy(self, proxy, session):
+            start = time.perf_counter()
+            try:
+                return await super().check_proxy(proxy, session)
+            finally:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = ProxyDatabase(os.path.join(tmp, 'bench.db'))
+        checker = TimedChecker({
+            'test_url': f"http://127.0.0.1:{options['echo_port']}/ip",
+            'max_workers': options['workers'],
+            'processes': options['processes'],
+            'prefilter_workers': options['prefilter_workers'],
+            'connect_timeout': options['connect_timeout'],
+            'request_timeout': options['request_timeout'],
+            'max_delay_ms': options['request_timeout'] * 1000,
+            'ip_api_concurrency': 1,
+            'protocols': options['protocols'],
+            'geoip_http_fallback': False
+        }, db)
+        candidates = (dict(candidate_address(i, options['proxy_ports']), port=options['dead_port'])
+                      if zlib.crc32(str(i).encode()) % 10000 < options['dead_rate'] * 10000
+                      else candidate_address(i, options['proxy_ports'])
+                      for i in range(size))
+        start = time.perf_counter()
+        asyncio.run(checker.run(candidates, NullSocketIO()))
+        elapsed = time.perf_counter() - start
+        checker.close()
+        working = len(db.load_proxies(3600))
+        db.close()
+    return {
+        'benchmark': 'checker',
+        'size': size,
+        'seconds': round(elapsed, 3),
+        'checks_per_sec': round(size / elapsed, 1),
+        # Check latency is only observable in-process; shards run the plain ProxyChecker
+        'p50_ms': round(statistics.median(latencies), 2) if latencies else 'n/a',
+        'p99_ms': round(percentile(latencies, 0.99), 2) if latencies else 'n/a',
+        'working_rows': working,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def bench_scraper(size: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    from scraper import ProxyScraper
+
+    rows = options['rows_per_page']
+    pages = max(1, size // rows)
+    sources = [f"http://127.0.0.1:{options['pages_port']}/page/{i}.{'txt' if i % 2 else 'html'}"
+               for i in range(pages)]
+    start = time.perf_counter()
+    proxies = asyncio.run(ProxyScraper(max_retries=0).scrape(sources, "benchmark", options['request_timeout']))
+    elapsed = time.perf_counter() - start
+    return {
+        'benchmark': 'scraper',
+        'size': size,
+        'pages': pages,
+        'seconds': round(elapsed, 3),
+        'rows_per_sec': round(len(proxies) / elapsed, 1),
+        'rows': len(proxies),
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def bench_db(size: int, options: Dict[str, Any]) -> Dict[str, Any]:
+    from database import ProxyDatabase
+
+    now = time.time()
+    proxies = [dict(candidate_address(i, [8080]), delay_ms=float(i % 900), country=f"C{i % 50}",
+                    updated=now, anonymity='elite' if i % 3 else 'transparent', protocol='http')
+               for i in range(size)]
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = ProxyDatabase(os.path.join(tmp, 'bench.db'))
+        start = time.perf_counter()
+        for i in range(0, size, 100):
+            db.save_proxies(proxies[i:i + 100])
+        db.flush()
+        timings['upsert_rows_per_sec'] = round(size / (time.perf_counter() - start), 1)
+
+        start = time.perf_counter()
+        db.record_checks([{'ip_address': p['ip_address'], 'port': p['port'], 'ok': True} for p in proxies],
+                         900, 1800, 604800)
+        db.flush()
+        timings['health_rows_per_sec'] = round(size / (time.perf_counter() - start), 1)
+
+        start = time.perf_counter()
+        queries = 200
+        for i in range(queries):
+            db.query_proxies(3600, {'country': [f"C{i % 50}"], 'max_delay_ms': 500}, limit=50)
+        timings['filtered_queries_per_sec'] = round(queries / (time.perf_counter() - start), 1)
+
+        start = time.perf_counter()
+        loaded = len(db.load_proxies(3600))
+        timings['full_load_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+        start = time.perf_counter()
+        db.cleanup_old_proxies(0)
+        timings['cleanup_ms'] = round((time.perf_counter() - start) * 1000, 2)
+        db.close()
+    return dict({'benchmark': 'db', 'size': size, 'rows_loaded': loaded}, **timings,
+                peak_rss_mb=peak_rss_mb())
+
+
+BENCHMARKS = {'checker': bench_checker, 'scraper': bench_scraper, 'db': bench_db}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline AutoProxyScraper benchmarks")
+    parser.add_argument('benchmark', choices=list(BENCHMARKS) + ['all'])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--workers', type=int, default=200)
+    parser.add_argument('--processes', type=int, default=1, help="Checker processes (0 = one per CPU core)")
+    parser.add_argument('--protocols', nargs='+', default=['http'])
+    parser.add_argument('--prefilter-workers', type=int, default=0, help="TCP pre-filter concurrency (0 = off)")
+    parser.add_argument('--connect-timeout', type=float, default=1.0)
+    parser.add_argument('--request-timeout', type=float, default=2.0)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--dead-rate', type=float, default=0.0, help="Candidates on a closed port (refused)")
+    parser.add_argument('--failure-rate', type=float, default=0.5)
+    parser.add_argument('--blackhole-rate', type=float, default=0.05)
+    parser.add_argument('--slow-rate', type=float, default=0.05)
+    parser.add_argument('--slow-chunk-ms', type=float, default=20.0)
+    parser.add_argument('--rows-per-page', type=int, default=500)
+    parser.add_argument('--base-port', type=int, default=28000)
+    parser.add_argument('--proxy-ports', type=int, default=8)
+    parser.add_argument('--json', action='store_true', help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    options = {
+        'workers': args.workers,
+        'processes': args.processes,
+        'protocols': args.protocols,
+        'prefilter_workers': args.prefilter_workers,
+        'connect_timeout': args.connect_timeout,
+        'request_timeout': args.request_timeout,
+        'latency_ms': args.latency_ms,
+        'dead_rate': args.dead_rate,
+        'failure_rate': args.failure_rate,
+        'blackhole_rate': args.blackhole_rate,
+        'slow_rate': args.slow_rate,
+        'slow_chunk_ms': args.slow_chunk_ms,
+        'rows_per_page': args.rows_per_page,
+        'origin': '10.255.255.1',
+        'echo_port': args.base_port,
+        'pages_port': args.base_port + 1,
+        'proxy_ports': [args.base_port + 2 + i for i in range(args.proxy_ports)],
+        'dead_port': args.base_port + 2 + args.proxy_ports
+    }
+
+    ready = multiprocessing.Event()
+    farm = multiprocessing.Process(target=run_farm, args=(options, ready), daemon=True)
+    farm.start()
+    if not ready.wait(10):
+        farm.terminate()
+        sys.exit("Fake proxy farm failed to start")
+
+    names = list(BENCHMARKS) if args.benchmark == 'all' else [args.benchmark]
+    try:
+        for name in names:
+            for size in args.sizes:
+                # Each case runs in a fresh process so peak RSS is measured per case
+                with ProcessPoolExecutor(max_workers=1) as executor:
+                    result = executor.submit(BENCHMARKS[name], size, options).result()
+                if args.json:
+                    print(json.dumps(result))
+                else:
+                    print("  ".join(f"{key}={value}" for key, value in result.items()))
+    finally:
+        farm.terminate()
+
+
+if __name__ == "__main__":
+    main()
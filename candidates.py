@@ -0,0 +1,139 @@
+import json
+import re
+import socket
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Iterator, List, Optional, Set, Tuple
+
+WHITESPACE_RE = re.compile(r'\s*')
+
+
+def pack_candidate(ip: str, port: int) -> Optional[int]:
+    # IPv4 address in the high 32 bits, port in the low 16; None for anything else (IPv6, hostnames)
+    # inet_pton only takes the four-part dotted-decimal form, unlike inet_aton ("1.2.3", "0x7f.1")
+    if not 0 <= port <= 0xFFFF:
+        return None
+    try:
+        return (int.from_bytes(socket.inet_pton(socket.AF_INET, ip), 'big') << 16) | port
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+class CandidateSet:
+    # Exact set of (ip, port) pairs. Packed IPv4 keys live in a sorted array (8 bytes per
+    # candidate) and new keys collect in a small set that is merged into it in bulk.
+    # Every FENCE_STEP-th sorted key is also kept in a plain list, so a lookup bisects the
+    # list and then only a short stretch of the array, where each probe boxes an int.
+    FENCE_STEP = 64
+    MERGE_WINDOW = 65536
+
+    def __init__(self, merge_threshold: int = 65536):
+        self.merge_threshold = merge_threshold
+        self._sorted = array('Q')
+        self._fences: List[int] = []
+        self._pending: Set[int] = set()
+        self._merge_at = merge_threshold
+        self._other: Set[Tuple[str, int]] = set()
+
+    def _contains_key(self, key: int) -> bool:
+        if key in self._pending:
+            return True
+        j = bisect_right(self._fences, key)
+        if j == 0:
+            return False
+        keys = self._sorted
+        lo = (j - 1) * self.FENCE_STEP
+        i = bisect_left(keys, key, lo, min(lo + self.FENCE_STEP, len(keys)))
+        return i < len(keys) and keys[i] == key
+
+    def _merge(self) -> None:
+        # The sorted array is merged window by window, so only MERGE_WINDOW existing keys are
+        # boxed as Python ints at a time instead of the whole set
+        old = self._sorted
+        pending = sorted(self._pending)
+        merged = array('Q')
+        start = 0
+        for lo in range(0, len(old), self.MERGE_WINDOW):
+            window = old[lo:lo + self.MERGE_WINDOW].tolist()
+            end = bisect_right(pending, window[-1], start)
+            window += pending[start:end]
+            window.sort()  # Two sorted runs, merged in linear time
+            merged.fromlist(window)
+            start = end
+        merged.fromlist(pending[start:])
+        self._sorted = merged
+        self._fences = merged[::self.FENCE_STEP].tolist()
+        self._pending.clear()
+        self._merge_at = max(self.merge_threshold, len(merged) // 8)
+
+    def add(self, ip: str, port: int) -> bool:
+        # Returns False when the candidate was already present
+        key = pack_candidate(ip, port)
+        if key is None:
+            if (ip, port) in self._other:
+                return False
+            self._other.add((ip, port))
+            return True
+        if self._contains_key(key):
+            return False
+        self._pending.add(key)
+        if len(self._pending) >= self._merge_at:
+            self._merge()
+        return True
+
+    def __contains__(self, candidate: Tuple[str, int]) -> bool:
+        key = pack_candidate(*candidate)
+        return candidate in self._other if key is None else self._contains_key(key)
+
+    def __len__(self) -> int:
+        return len(self._sorted) + len(self._pending) + len(self._other)
+
+
+def iter_json_array(path: str, chunk_size: int = 65536) -> Iterator[Any]:
+    # Yields the items of a top-level JSON array while reading the file in chunks
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, pos, eof = '', 0, False
+        started, expect_item, first = False, False, True
+        while True:
+            pos = WHITESPACE_RE.match(buffer, pos).end()
+            if pos == len(buffer):
+                if eof:
+                    raise json.JSONDecodeError("Unexpected end of JSON array", buffer, pos)
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+                continue
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise json.JSONDecodeError("Expected a JSON array", buffer, pos)
+                started, expect_item = True, True
+                pos += 1
+            elif expect_item:
+                if char == ']' and first:
+                    return
+                try:
+                    item, end = decoder.raw_decode(buffer, pos)
+                    # A value cut at the chunk edge may still parse ("2." of "2.5"), so it only
+                    # counts once the following separator has been read
+                    after = WHITESPACE_RE.match(buffer, end).end()
+                    complete = eof or (after < len(buffer) and buffer[after] in ',]')
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    complete = False
+                if not complete:
+                    chunk = f.read(chunk_size)
+                    eof = not chunk
+                    buffer, pos = buffer[pos:] + chunk, 0
+                    continue
+                yield item
+                pos, expect_item, first = end, False, False
+            elif char == ']':
+                return
+            elif char == ',':
+                expect_item = True
+                pos += 1
+            else:
+                raise json.JSONDecodeError("Expected ',' or ']'", buffer, pos)
@@ -1,90 +1,498 @@
 import sqlite3
+import json
 import logging
+import queue
+import random
 import time  # Added import for time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple, Callable
+from concurrent.futures import Future
 from contextlib import contextmanager
-from threading import Lock
+from threading import Lock, Thread
+from metrics import REGISTRY
 
 logger = logging.getLogger(__name__)
 
+SORT_COLUMNS = {'delay_ms': 'delay_ms', 'updated': 'updated'}
+POOL_TIMEOUT = 30  # Seconds to wait for a free pooled connection
+WRITER_BATCH_SIZE = 64  # Max queued write operations committed in one transaction
+
+DB_READ_DURATION = REGISTRY.histogram('proxy_db_read_seconds', 'Duration of database reads', ['operation'])
+DB_WRITE_DURATION = REGISTRY.histogram('proxy_db_write_seconds', 'Duration of queued database write operations',
+                                       ['operation'])
+DB_TRANSACTION_DURATION = REGISTRY.histogram('proxy_db_transaction_seconds',
+                                             'Duration of batched writer transactions including commit')
+DB_TRANSACTION_OPS = REGISTRY.counter('proxy_db_write_operations_total', 'Write operations committed by the writer')
+
+
 class ProxyDatabase:
-    def __init__(self, db_file: str, pool_size: int = 5):
+    def __init__(self, db_file: str, pool_size: int = 5, mmap_size: int = 268435456, cache_size_kb: int = 16384):
         self.db_file = db_file
         self.pool_size = pool_size
-        self.conn_pool: List[sqlite3.Connection] = []
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self.conn_pool: queue.Queue = queue.Queue(maxsize=pool_size)
+        self.conn_count = 0
         self.lock = Lock()
+        self._write_queue: queue.Queue = queue.Queue()
         self._init_db()
+        self._writer = Thread(target=self._writer_loop, name="ProxyDatabaseWriter", daemon=True)
+        self._writer.start()
+
+    def _connect(self, autocommit: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, timeout=30,
+                               isolation_level=None if autocommit else '')
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers proceed while the writer commits; NORMAL sync is durable across app crashes in WAL mode
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size=-{int(self.cache_size_kb)}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        return conn
 
     def _init_db(self) -> None:
         with self._get_connection() as conn:
             cursor = conn.cursor()
+            # DDL would otherwise autocommit statement by statement. One IMMEDIATE transaction makes the
+            # migration all-or-nothing and lets processes starting together (checker, API workers) take turns.
+            cursor.execute('BEGIN IMMEDIATE')
             cursor.execute('''CREATE TABLE IF NOT EXISTS proxies
                             (ip_address TEXT, port INTEGER, delay_ms REAL, country TEXT, updated REAL,
-                             anonymity TEXT, protocol TEXT, PRIMARY KEY (ip_address, port))''')
+                             anonymity TEXT, protocol TEXT, PRIMARY KEY (ip_address, port, protocol))''')
+            self._migrate_protocol_key(cursor)
             cursor.execute('CREATE INDEX IF NOT EXISTS idx_updated ON proxies(updated)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_delay ON proxies(delay_ms)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_country_delay ON proxies(country, delay_ms)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_protocol_anonymity_delay ON proxies(protocol, anonymity, delay_ms)')
+            cursor.execute('''CREATE TABLE IF NOT EXISTS proxy_health
+                            (ip_address TEXT, port INTEGER, successes INTEGER DEFAULT 0, failures INTEGER DEFAULT 0,
+                             consecutive_failures INTEGER DEFAULT 0, backoff REAL DEFAULT 0, last_checked REAL,
+                             next_check REAL DEFAULT 0, last_error TEXT, last_success REAL,
+                             PRIMARY KEY (ip_address, port))''')
+            health_columns = [row['name'] for row in cursor.execute('PRAGMA table_info(proxy_health)')]
+            for column, column_type in (('last_error', 'TEXT'), ('last_success', 'REAL')):
+                if column not in health_columns:
+                    cursor.execute(f'ALTER TABLE proxy_health ADD COLUMN {column} {column_type}')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_health_next_check ON proxy_health(next_check)')
+            # Shared state between the checker and API server processes: data version and last events
+            cursor.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)')
+            cursor.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 0)")
             conn.commit()
             logger.debug("Database schema initialized")
 
+    def _migrate_protocol_key(self, cursor: sqlite3.Cursor) -> None:
+        # Databases created before multi-protocol checks keyed proxies by (ip_address, port) only.
+        # A proxies_old table is what an interrupted run of the earlier, non-atomic migration left behind.
+        sources = []
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'proxies_old'").fetchone():
+            logger.warning("Recovering proxies left in proxies_old by an interrupted migration")
+            sources.append('proxies_old')
+        primary_key = [row['name'] for row in cursor.execute('PRAGMA table_info(proxies)') if row['pk']]
+        if 'protocol' not in primary_key:
+            logger.info("Migrating proxies table to per-protocol primary key")
+            cursor.execute('ALTER TABLE proxies RENAME TO proxies_unmigrated')
+            sources.append('proxies_unmigrated')
+            cursor.execute('''CREATE TABLE proxies
+                            (ip_address TEXT, port INTEGER, delay_ms REAL, country TEXT, updated REAL,
+                             anonymity TEXT, protocol TEXT, PRIMARY KEY (ip_address, port, protocol))''')
+        for table in sources:
+            # Indexes keep their names across the rename; drop them so they are recreated on the new table
+            cursor.execute('DROP INDEX IF EXISTS idx_updated')
+            cursor.execute('DROP INDEX IF EXISTS idx_delay')
+            cursor.execute('DROP INDEX IF EXISTS idx_country_delay')
+            cursor.execute('DROP INDEX IF EXISTS idx_protocol_anonymity_delay')
+            # Rows checked since an interrupted migration are newer than the recovered ones
+            cursor.execute(f'''INSERT OR IGNORE INTO proxies
+                               SELECT ip_address, port, delay_ms, country, updated, anonymity, COALESCE(protocol, 'http')
+                               FROM {table}''')
+            cursor.execute(f'DROP TABLE {table}')
+
+    @property
+    def version(self) -> int:
+        # Bumped on every change to the proxies table, used to invalidate read caches. Stored in the
+        # database so API server processes also see writes made by the checker process.
+        with self._get_connection() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+        return row['value'] if row else 0
+
     @contextmanager
     def _get_connection(self):
-        with self.lock:
-            if not self.conn_pool:
-                conn = sqlite3.connect(self.db_file, check_same_thread=False)
-                conn.row_factory = sqlite3.Row
-                self.conn_pool.append(conn)
-            conn = self.conn_pool.pop(0)
-        
+        try:
+            conn = self.conn_pool.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                create = self.conn_count < self.pool_size
+                if create:
+                    self.conn_count += 1
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self.lock:
+                        self.conn_count -= 1  # The slot is free again for the next caller
+                    raise
+            else:
+                try:
+                    conn = self.conn_pool.get(timeout=POOL_TIMEOUT)
+                except queue.Empty:
+                    # Surfaced as a database error, which every reader already handles
+                    logger.error(f"No pooled database connection became free within {POOL_TIMEOUT}s")
+                    raise sqlite3.OperationalError("database connection pool exhausted")
+
         try:
             yield conn
         finally:
-            with self.lock:
+            if conn.in_transaction:
+                conn.rollback()
+            self.conn_pool.put(conn)
+
+    def _writer_loop(self) -> None:
+        # Single writer: queued write operations are grouped into one transaction, each in
+        # its own savepoint so a failing operation does not roll back the rest of the batch
+        conn = self._connect(autocommit=True)
+        cursor = conn.cursor()
+        while True:
+            ops = [self._write_queue.get()]
+            while len(ops) < WRITER_BATCH_SIZE:
                 try:
-                    conn.execute("SELECT 1")  # Check connection validity
-                    self.conn_pool.append(conn)
-                except sqlite3.Error:
-                    logger.warning("Invalid connection, closing")
-                    conn.close()
+                    ops.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in ops
+            ops = [op for op in ops if op is not None]
+            done = []
+            changed = False
+            transaction_start = time.perf_counter()
+            try:
+                cursor.execute('BEGIN IMMEDIATE')
+                for write, future, operation in ops:
+                    cursor.execute('SAVEPOINT write_op')
+                    op_start = time.perf_counter()
+                    try:
+                        result, op_changed = write(cursor)
+                        DB_WRITE_DURATION.observe(time.perf_counter() - op_start, operation=operation)
+                        cursor.execute('RELEASE write_op')
+                        done.append((future, result, None))
+                        changed = changed or op_changed
+                    except Exception as e:
+                        # Any failure (also e.g. OverflowError while binding) only discards this operation
+                        cursor.execute('ROLLBACK TO write_op')
+                        cursor.execute('RELEASE write_op')
+                        done.append((future, None, e))
+                if changed:
+                    cursor.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+                cursor.execute('COMMIT')
+                DB_TRANSACTION_DURATION.observe(time.perf_counter() - transaction_start)
+                DB_TRANSACTION_OPS.inc(len(ops))
+            except Exception as e:
+                # The writer thread must survive, or every pending and future write would wait forever
+                logger.error(f"Database writer transaction failed: {e}")
+                if conn.in_transaction:
+                    conn.rollback()
+                done = [(future, None, e) for _, future, _ in ops]
+            for future, result, error in done:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            if stop:
+                conn.close()
+                return
+
+    def _submit(self, write: Callable[[sqlite3.Cursor], Tuple[Any, bool]], operation: str) -> Future:
+        future: Future = Future()
+
+        def log_error(f: Future) -> None:
+            if f.exception() is not None:
+                logger.error(f"Database error in {operation}: {f.exception()}")
+
+        future.add_done_callback(log_error)
+        self._write_queue.put((write, future, operation))
+        return future
+
+    def flush(self) -> None:
+        # Blocks until every write queued before this call is committed
+        self._submit(lambda cursor: (None, False), 'flush').result()
+
+    def close(self) -> None:
+        self._write_queue.put(None)
+        self._writer.join()
+        while True:
+            try:
+                self.conn_pool.get_nowait().close()
+            except queue.Empty:
+                break
 
     def save_proxies(self, proxies: List[Dict[str, Any]]) -> None:
         if not proxies:
             logger.debug("No proxies to save")
             return
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.executemany(
-                    '''INSERT OR REPLACE INTO proxies
-                       (ip_address, port, delay_ms, country, updated, anonymity, protocol)
-                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                    [(p['ip_address'], p['port'], p['delay_ms'], p['country'], p['updated'],
-                      p['anonymity'], p['protocol']) for p in proxies]
-                )
-                conn.commit()
-                logger.info(f"Saved {len(proxies)} proxies to database")
-            except sqlite3.Error as e:
-                logger.error(f"Database error saving proxies: {e}")
+        rows = [(p['ip_address'], p['port'], p['delay_ms'], p['country'], p['updated'],
+                 p['anonymity'], p['protocol']) for p in proxies]
+
+        def write(cursor: sqlite3.Cursor) -> Tuple[None, bool]:
+            cursor.executemany(
+                '''INSERT OR REPLACE INTO proxies
+                   (ip_address, port, delay_ms, country, updated, anonymity, protocol)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                rows
+            )
+            logger.info(f"Saved {len(rows)} proxies to database")
+            return None, True
+
+        self._submit(write, 'save_proxies')
 
     def load_proxies(self, ttl: float) -> List[Dict[str, Any]]:
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            try:
+        try:
+            with DB_READ_DURATION.time(operation='load_proxies'), self._get_connection() as conn:
+                cursor = conn.cursor()
                 cursor.execute('SELECT * FROM proxies WHERE updated > ?', (time.time() - ttl,))
                 proxies = [dict(row) for row in cursor.fetchall()]
                 logger.info(f"Loaded {len(proxies)} proxies from database")
                 return proxies
-            except sqlite3.Error as e:
-                logger.error(f"Database error loading proxies: {e}")
-                return []
+        except sqlite3.Error as e:
+            logger.error(f"Database error loading proxies: {e}")
+            return []
 
-    def cleanup_old_proxies(self, ttl: float) -> int:
-        with self._get_connection() as conn:
-            cursor = conn.cursor()
-            try:
-                cursor.execute('DELETE FROM proxies WHERE updated < ?', (time.time() - ttl,))
-                deleted = cursor.rowcount
-                conn.commit()
-                logger.info(f"Cleaned up {deleted} old proxies")
-                return deleted
-            except sqlite3.Error as e:
-                logger.error(f"Database error cleaning up proxies: {e}")
-                return 0
\ No newline at end of file
+    def _filter_clause(self, ttl: float, filters: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        now = time.time()
+        clauses = ['updated > ?']
+        params: List[Any] = [now - ttl]
+        for column in ('country', 'anonymity', 'protocol'):
+            values = filters.get(column)
+            if values:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        if filters.get('max_delay_ms') is not None:
+            clauses.append('delay_ms <= ?')
+            params.append(filters['max_delay_ms'])
+        if filters.get('min_freshness') is not None:
+            clauses.append('updated >= ?')
+            params.append(now - filters['min_freshness'])
+        return ' AND '.join(clauses), params
+
+    def query_proxies(self, ttl: float, filters: Dict[str, Any], sort: str = 'delay_ms', descending: bool = False,
+                      limit: int = 100, after: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        # Keyset pagination: `after` is the (sort value, ip_address, port, protocol) of the last row seen
+        column = SORT_COLUMNS[sort]
+        where, params = self._filter_clause(ttl, filters)
+        direction = 'DESC' if descending else 'ASC'
+        if after is not None:
+            where += f" AND ({column}, ip_address, port, protocol) {'<' if descending else '>'} (?, ?, ?, ?)"
+            params.extend(after)
+        try:
+            with DB_READ_DURATION.time(operation='query_proxies'), self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    f'''SELECT * FROM proxies WHERE {where}
+                        ORDER BY {column} {direction}, ip_address {direction}, port {direction}, protocol {direction}
+                        LIMIT ?''',
+                    params + [limit]
+                )
+                return [dict(row) for row in cursor.fetchall()]
+        except sqlite3.Error as e:
+            logger.error(f"Database error querying proxies: {e}")
+            return []
+
+    def iter_proxies(self, ttl: float, filters: Dict[str, Any], sort: str = 'delay_ms', descending: bool = False,
+                     page_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        # Walks all matching rows in keyset pages; the pooled connection is released between pages,
+        # so a slow consumer holds neither a connection nor a long-running read transaction
+        column = SORT_COLUMNS[sort]
+        after = None
+        while True:
+            rows = self.query_proxies(ttl, filters, sort, descending, page_size, after)
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last = rows[-1]
+            after = [last[column], last['ip_address'], last['port'], last['protocol']]
+
+    def pick_proxy(self, ttl: float, filters: Dict[str, Any], strategy: str = 'best') -> Optional[Dict[str, Any]]:
+        where, params = self._filter_clause(ttl, filters)
+        try:
+            with DB_READ_DURATION.time(operation='pick_proxy'), self._get_connection() as conn:
+                cursor = conn.cursor()
+                if strategy == 'random':
+                    # COUNT + OFFSET walks the index instead of sorting the whole match set by RANDOM()
+                    cursor.execute(f'SELECT COUNT(*) FROM proxies WHERE {where}', params)
+                    count = cursor.fetchone()[0]
+                    if not count:
+                        return None
+                    cursor.execute(f'SELECT * FROM proxies WHERE {where} LIMIT 1 OFFSET ?',
+                                   params + [random.randrange(count)])
+                else:
+                    cursor.execute(f'SELECT * FROM proxies WHERE {where} ORDER BY delay_ms LIMIT 1', params)
+                row = cursor.fetchone()
+                return dict(row) if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Database error picking proxy: {e}")
+            return None
+
+    def remove_proxies(self, keys: List[Tuple[str, int, str]]) -> None:
+        if not keys:
+            return
+        keys = list(keys)
+
+        def write(cursor: sqlite3.Cursor) -> Tuple[int, bool]:
+            cursor.executemany('DELETE FROM proxies WHERE ip_address = ? AND port = ? AND protocol = ?', keys)
+            removed = cursor.rowcount
+            if removed:
+                logger.info(f"Removed {removed} proxies that failed re-check")
+            return removed, removed > 0
+
+        self._submit(write, 'remove_proxies')
+
+    def cleanup_old_proxies(self, ttl: float, max_failures: int = 0, forget_after: float = 0) -> int:
+        # Health rows of candidates that never worked and failed max_failures times in a row, or that
+        # have been failing since their last success forget_after seconds ago, are dropped as well.
+        # A forgotten candidate that is scraped again starts over as a new one.
+        def write(cursor: sqlite3.Cursor) -> Tuple[int, bool]:
+            now = time.time()
+            cursor.execute('DELETE FROM proxies WHERE updated < ?', (now - ttl,))
+            deleted = cursor.rowcount
+            forgotten = 0
+            if max_failures:
+                cursor.execute('DELETE FROM proxy_health WHERE successes = 0 AND consecutive_failures >= ?',
+                               (max_failures,))
+                forgotten += cursor.rowcount
+            if forget_after:
+                cursor.execute('DELETE FROM proxy_health WHERE consecutive_failures > 0 AND last_success < ?',
+                               (now - forget_after,))
+                forgotten += cursor.rowcount
+            logger.info(f"Cleaned up {deleted} old proxies and forgot {forgotten} dead candidates")
+            return deleted, deleted > 0
+
+        try:
+            return self._submit(write, 'cleanup_old_proxies').result()
+        except Exception:
+            return 0  # Already logged by _submit
+
+    def schedule_candidates(self, proxies: Iterable[Dict[str, Any]]) -> int:
+        rows = [(p['ip_address'], int(p['port'])) for p in proxies]
+        if not rows:
+            return 0
+
+        def write(cursor: sqlite3.Cursor) -> Tuple[int, bool]:
+            cursor.executemany(
+                'INSERT OR IGNORE INTO proxy_health (ip_address, port, next_check) VALUES (?, ?, 0)',
+                rows
+            )
+            added = cursor.rowcount
+            logger.info(f"Scheduled {added} new candidates out of {len(rows)}")
+            return added, False
+
+        try:
+            return self._submit(write, 'schedule_candidates').result()
+        except Exception:
+            return 0  # Already logged by _submit
+
+    def load_due_proxies(self, limit: int) -> List[Dict[str, Any]]:
+        # Most overdue first; among equally overdue, proxies with a better track record win
+        try:
+            with DB_READ_DURATION.time(operation='load_due_proxies'), self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    '''SELECT ip_address, port FROM proxy_health WHERE next_check <= ?
+                       ORDER BY next_check, successes DESC LIMIT ?''',
+                    (time.time(), limit)
+                )
+                proxies = [dict(row) for row in cursor.fetchall()]
+                logger.info(f"Loaded {len(proxies)} proxies due for check")
+                return proxies
+        except sqlite3.Error as e:
+            logger.error(f"Database error loading due proxies: {e}")
+            return []
+
+    def record_checks(self, outcomes: List[Dict[str, Any]], success_interval: float,
+                      base_backoff: float, max_backoff: float) -> None:
+        # Working proxies are re-verified every success_interval; each consecutive
+        # failure doubles the wait before the next probe, up to max_backoff.
+        # The failure reason of the latest check is kept until the candidate works again.
+        if not outcomes:
+            return
+        now = time.time()
+        params = [{
+            'ip_address': o['ip_address'],
+            'port': int(o['port']),
+            'ok': 1 if o['ok'] else 0,
+            'error': None if o['ok'] else o.get('error'),
+            'now': now,
+            'success_interval': success_interval,
+            'base_backoff': base_backoff,
+            'max_backoff': max_backoff
+        } for o in outcomes]
+
+        def write(cursor: sqlite3.Cursor) -> Tuple[None, bool]:
+            cursor.executemany(
+                '''INSERT INTO proxy_health
+                   (ip_address, port, successes, failures, consecutive_failures, backoff, last_checked, next_check,
+                    last_error, last_success)
+                   VALUES (:ip_address, :port, :ok, 1 - :ok, 1 - :ok,
+                           CASE WHEN :ok THEN :success_interval ELSE :base_backoff END, :now,
+                           :now + CASE WHEN :ok THEN :success_interval ELSE :base_backoff END, :error,
+                           CASE WHEN :ok THEN :now END)
+                   ON CONFLICT (ip_address, port) DO UPDATE SET
+                       successes = successes + :ok,
+                       failures = failures + 1 - :ok,
+                       consecutive_failures = CASE WHEN :ok THEN 0 ELSE consecutive_failures + 1 END,
+                       backoff = CASE WHEN :ok THEN :success_interval
+                                      WHEN consecutive_failures = 0 THEN :base_backoff
+                                      ELSE MIN(:max_backoff, backoff * 2) END,
+                       last_checked = :now,
+                       next_check = :now + CASE WHEN :ok THEN :success_interval
+                                                WHEN consecutive_failures = 0 THEN :base_backoff
+                                                ELSE MIN(:max_backoff, backoff * 2) END,
+                       last_error = :error,
+                       last_success = CASE WHEN :ok THEN :now ELSE last_success END''',
+                params
+            )
+            logger.debug(f"Recorded {len(params)} check outcomes")
+            return None, False
+
+        self._submit(write, 'record_checks')
+
+    def failure_summary(self) -> Dict[str, int]:
+        # Candidates currently held back by their failure backoff, grouped by the last failure reason
+        try:
+            with DB_READ_DURATION.time(operation='failure_summary'), self._get_connection() as conn:
+                cursor = conn.execute(
+                    '''SELECT COALESCE(last_error, 'unknown') AS reason, COUNT(*) AS count FROM proxy_health
+                       WHERE next_check > ? AND consecutive_failures > 0 GROUP BY reason''',
+                    (time.time(),)
+                )
+                return {row['reason']: row['count'] for row in cursor.fetchall()}
+        except sqlite3.Error as e:
+            logger.error(f"Database error summarizing failures: {e}")
+            return {}
+
+    def _save_meta(self, key: str, value: str) -> None:
+        def write(cursor: sqlite3.Cursor) -> Tuple[None, bool]:
+            cursor.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+            return None, False
+
+        self._submit(write, 'save_meta')
+
+    def _load_meta(self, key: str) -> Optional[str]:
+        try:
+            with self._get_connection() as conn:
+                row = conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+                return row['value'] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"Database error loading {key}: {e}")
+            return None
+
+    def save_event(self, event: str, payload: Dict[str, Any]) -> None:
+        # Latest payload per event; API server processes pick it up with load_event
+        self._save_meta(f"event:{event}", json.dumps(payload))
+
+    def load_event(self, event: str) -> Optional[str]:
+        return self._load_meta(f"event:{event}")
+
+    def save_state(self, key: str, value: Any) -> None:
+        # Small JSON values that must survive restarts, such as scheduler checkpoints
+        self._save_meta(f"state:{key}", json.dumps(value))
+
+    def load_state(self, key: str, default: Any = None) -> Any:
+        value = self._load_meta(f"state:{key}")
+        return json.loads(value) if value is not None else default
\ No newline at end of file
@@ -0,0 +1,14 @@
+#!/bin/sh
+# Runs the checker and the API server side by side. `docker stop` sends SIGTERM to this script,
+# which passes it on to both, so the checker flushes its pending results before the container exits.
+python main.py --checker-only &
+checker=$!
+# One worker by default: /metrics then covers every API request (each worker keeps its own counters)
+gunicorn -w "${API_WORKERS:-1}" --threads "${API_THREADS:-200}" -b 0.0.0.0:5000 api_server:app &
+api=$!
+
+trap 'kill -TERM "$checker" "$api" 2>/dev/null' TERM INT
+# Returns when a signal arrives or the API server exits
+wait "$api"
+kill -TERM "$checker" "$api" 2>/dev/null
+wait
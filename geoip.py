@@ -0,0 +1,138 @@
+import asyncio
+import aiohttp
+import csv
+import ipaddress
+import logging
+import multiprocessing
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Optional
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_COUNTRY = "Unknown"
+
+GEOIP_DURATION = REGISTRY.histogram('proxy_geoip_lookup_seconds', 'Country lookup duration by resolver',
+                                    ['source'], buckets=(0.00001, 0.0001, 0.001, 0.01, 0.1, 0.5, 1.0, 5.0))
+
+
+class OfflineCountryResolver:
+    # Range table rows: start_ip,end_ip,country_code[,...]. Addresses may be dotted IPv4
+    # or integers (DB-IP lite / IP2Location LITE layouts); IPv6 rows are skipped.
+    # Only the ISO 3166-1 alpha-2 code is kept, the same form IpApiCountryResolver returns.
+    def __init__(self, table_file: str, cache_size: int = 65536):
+        self.starts = array('I')
+        self.ends = array('I')
+        self.country_ids = array('H')
+        self.countries: List[str] = []
+        self._load(table_file)
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @staticmethod
+    def _parse_ip(value: str) -> int:
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        return int(ipaddress.IPv4Address(value))
+
+    def _load(self, table_file: str) -> None:
+        country_index: Dict[str, int] = {}
+        rows = []
+        with open(table_file, 'r', encoding='utf-8', newline='') as f:
+            for row in csv.reader(f):
+                if len(row) < 3 or ':' in row[0]:
+                    continue
+                try:
+                    start, end = self._parse_ip(row[0]), self._parse_ip(row[1])
+                except ValueError:
+                    continue  # Header or malformed row
+                if start > 0xFFFFFFFF or end > 0xFFFFFFFF:
+                    continue
+                country = row[2].strip().upper()
+                if country not in country_index:
+                    country_index[country] = len(self.countries)
+                    self.countries.append(country)
+                rows.append((start, end, country_index[country]))
+
+        rows.sort()
+        for start, end, country_id in rows:
+            self.starts.append(start)
+            self.ends.append(end)
+            self.country_ids.append(country_id)
+        logger.info(f"Loaded {len(self.starts)} GeoIP ranges for {len(self.countries)} countries from {table_file}")
+
+    def _lookup(self, ip: str) -> Optional[str]:
+        try:
+            value = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return None
+        i = bisect_right(self.starts, value) - 1
+        if i >= 0 and value <= self.ends[i]:
+            country = self.countries[self.country_ids[i]]
+            return country if country not in ('', '-', 'ZZ') else None
+        return None
+
+
+class IpApiCountryResolver:
+    def __init__(self, concurrency: int, timeout: float):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+
+    async def lookup(self, ip: str, session: aiohttp.ClientSession) -> str:
+        async with self.semaphore:
+            try:
+                async with session.get(
+                    f"http://ip-api.com/json/{ip}?fields=status,countryCode",
+                    timeout=self.timeout
+                ) as response:
+                    logger.debug(f"IP API response for {ip}: {response.status}")
+                    if response.status == 200:
+                        data = await response.json()
+                        if data.get("status") == "success" and data.get("countryCode"):
+                            return data["countryCode"].upper()
+                        return UNKNOWN_COUNTRY
+                    logger.info(f"IP API returned status {response.status} for {ip}")
+                    return UNKNOWN_COUNTRY
+            except Exception as e:
+                logger.info(f"Error fetching country for IP {ip}: {e}")
+                return UNKNOWN_COUNTRY
+
+
+class CountryResolver:
+    def __init__(self, offline: Optional[OfflineCountryResolver] = None,
+                 fallback: Optional[IpApiCountryResolver] = None):
+        self.offline = offline
+        self.fallback = fallback
+
+    async def resolve(self, ip: str, session: aiohttp.ClientSession) -> str:
+        if self.offline is not None:
+            with GEOIP_DURATION.time(source='offline'):
+                country = self.offline.lookup(ip)
+            if country:
+                return country
+        if self.fallback is not None:
+            with GEOIP_DURATION.time(source='http'):
+                return await self.fallback.lookup(ip, session)
+        return UNKNOWN_COUNTRY
+
+
+def create_country_resolver(config: Dict) -> CountryResolver:
+    offline = None
+    table_file = config.get('geoip_file')
+    if table_file:
+        if Path(table_file).is_file():
+            try:
+                offline = OfflineCountryResolver(table_file, config.get('geoip_cache_size', 65536))
+            except (OSError, csv.Error) as e:
+                logger.error(f"Failed to load GeoIP table {table_file}: {e}")
+        elif multiprocessing.parent_process() is None:  # Warn once, not again in every check shard
+            logger.warning(f"GeoIP table {table_file} not found, offline geolocation disabled; "
+                           f"see geoip_file in config.yaml for where to download one")
+
+    fallback = None
+    if config.get('geoip_http_fallback', False):
+        fallback = IpApiCountryResolver(config['ip_api_concurrency'], config['request_timeout'])
+    return CountryResolver(offline, fallback)
@@ -0,0 +1,69 @@
+import asyncio
+import json
+import logging
+import re
+from threading import Thread
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Headers that only appear when a proxy announces itself or forwards client information
+PROXY_HEADERS = (
+    'via', 'x-forwarded-for', 'x-forwarded-host', 'x-forwarded-proto', 'forwarded', 'x-real-ip',
+    'client-ip', 'x-client-ip', 'x-proxy-id', 'proxy-connection', 'x-bluecoat-via', 'x-originating-ip',
+    'cf-connecting-ip', 'true-client-ip'
+)
+MAX_HEADER_BYTES = 16384
+TOKEN_SPLIT_RE = re.compile(r'[\s,;="\[\]]+')
+
+
+def classify_anonymity(data: Dict[str, Any], proxy_ip: str, own_ip: Optional[str]) -> str:
+    # transparent: our own address leaks through; anonymous: the proxy reveals itself;
+    # elite: the request looks like it came straight from the proxy
+    origin = str(data.get('origin', ''))
+    headers = {str(k).lower(): str(v) for k, v in (data.get('headers') or {}).items()}
+    if own_ip is None:
+        return 'elite' if origin != proxy_ip else 'transparent'
+    if own_ip in TOKEN_SPLIT_RE.split(origin):
+        return 'transparent'
+    for name in PROXY_HEADERS:
+        if name in headers and own_ip in TOKEN_SPLIT_RE.split(headers[name]):
+            return 'transparent'
+    if any(name in headers for name in PROXY_HEADERS):
+        return 'anonymous'
+    return 'elite'
+
+
+async def handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), 10)
+        if len(head) > MAX_HEADER_BYTES:
+            return
+        lines = head.decode('latin-1').split("\r\n")
+        headers = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(':')
+            if sep:
+                headers[name.strip()] = value.strip()
+        body = json.dumps({'origin': writer.get_extra_info('peername')[0], 'headers': headers}).encode()
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nCache-Control: no-store\r\n"
+                     + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_judge(host: str, port: int) -> None:
+    server = await asyncio.start_server(handle_request, host, port, backlog=1024, limit=MAX_HEADER_BYTES)
+    logger.info(f"Proxy judge listening on {host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def start_judge(host: str, port: int) -> Thread:
+    # Runs on its own event loop thread so judge responses are not delayed by the check loop
+    thread = Thread(target=lambda: asyncio.run(serve_judge(host, port)), name="ProxyJudge", daemon=True)
+    thread.start()
+    return thread
@@ -1,28 +1,32 @@
+import argparse
 import asyncio
 import json
 import logging
 import logging.handlers
+import signal
 import sys
 import time
 from threading import Thread
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Iterable, Iterator, AsyncIterator, TYPE_CHECKING
 from pathlib import Path
-import random
 
 # Add project root to sys.path for direct execution
 sys.path.append(str(Path(__file__).parent))
 
 
+# Only lightweight modules are imported up front; Flask, aiohttp, lxml and tqdm are loaded
+# by the subsystem that needs them, so the web server starts before the checker stack is imported
 try:
     from config_manager import load_config
     from database import ProxyDatabase
-    from proxy_checker import ProxyChecker
-    from scraper import scrape_proxies
-    from web_app import create_app
+    from candidates import CandidateSet, iter_json_array
 except ImportError as e:
     print(f"Import error: {e}. Ensure all modules are in the project directory.")
     sys.exit(1)
 
+if TYPE_CHECKING:
+    from proxy_checker import ProxyChecker
+
 def setup_logging(log_file: str) -> None:
     handler = logging.handlers.RotatingFileHandler(
         log_file, maxBytes=10_000_000, backupCount=5, encoding='utf-8'
@@ -33,84 +37,192 @@ def setup_logging(log_file: str) -> None:
     logging.getLogger().setLevel(logging.DEBUG)  # Keep DEBUG for detailed logging
     logger.debug("Logging setup completed")
 
-async def process_proxies(config: Dict[str, Any], checker: ProxyChecker, socketio) -> None:
-    logger.debug("Starting process_proxies")
-    db = checker.db
-    all_proxies = db.load_proxies(config['proxy']['ttl'])
-    logger.debug(f"Loaded {len(all_proxies)} proxies from database")
-    
+def load_backup_proxies(backup_file: str) -> Iterator[Dict[str, Any]]:
+    # Streamed item by item, so large backup files are never held in memory as a whole
+    count = 0
     try:
-        new_proxies = await scrape_proxies(
+        for proxy in iter_json_array(backup_file):
+            count += 1
+            yield proxy
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        logger.warning(f"Failed to load backup proxies: {e}")
+    logger.info(f"Loaded {count} backup proxies")
+
+def valid_candidates(proxies: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    for proxy in proxies:
+        try:
+            ip, port = str(proxy['ip_address']).strip(), int(proxy['port'])
+        except (KeyError, TypeError, ValueError):
+            ip, port = '', 0
+        # Same bounds as scraper._make_proxy; an out-of-range port would otherwise reach the database
+        if not ip or not 0 < port < 65536:
+            logger.debug(f"Skipping malformed candidate: {proxy}")
+            continue
+        yield {'ip_address': ip, 'port': port}
+
+async def iter_candidates(config: Dict[str, Any], db: ProxyDatabase, scrape: bool,
+                          known: CandidateSet, stats: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+    # New candidates are registered with the scheduler and checked right away; known ones
+    # are only yielded once their health history says they are due for another probe.
+    # `known` outlives the cycle, so repeated scrape results are not re-sent to the database.
+    # `stats` announces the number of due candidates to the progress reporter as soon as it is known.
+    max_due = config.get('scheduler', {}).get('max_due_per_cycle', 20000)
+    seen = CandidateSet()
+    stats = stats if stats is not None else {}
+    stats.update(total=0, final=False)
+
+    def unknown(proxies: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for proxy in proxies:
+            if known.add(proxy['ip_address'], proxy['port']):
+                yield proxy
+
+    def unseen(proxies: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        for proxy in proxies:
+            if not seen.add(proxy['ip_address'], proxy['port']):
+                continue
+            stats['total'] += 1
+            yield proxy
+
+    scrape_task = None
+    if scrape:
+        from scraper import scrape_proxies
+        # Scraping runs in the background while database and backup candidates are already being checked
+        scrape_task = asyncio.create_task(scrape_proxies(
             config['scraper']['urls'],
             config['scraper']['user_agent'],
             config['scraper']['timeout']
-        )
-        logger.info(f"Scraped {len(new_proxies)} new proxies")
-    except Exception as e:
-        logger.error(f"Scraping failed: {e}", exc_info=True)
-        new_proxies = []
-        logger.info("Continuing with database and backup proxies")
+        ))
+        # Database calls that wait for the writer run in a thread so check workers keep running meanwhile
+        await asyncio.to_thread(lambda: db.schedule_candidates(unknown(db.load_proxies(config['proxy']['ttl']))))
+        await asyncio.to_thread(lambda: db.schedule_candidates(
+            unknown(valid_candidates(load_backup_proxies(config['backup_proxies']['file'])))
+        ))
 
     try:
-        with open(config['backup_proxies']['file'], 'r', encoding='utf-8') as f:
-            backup_proxies = json.load(f)
-            if not isinstance(backup_proxies, list):
-                logger.warning("Backup proxies file contains invalid data")
-                backup_proxies = []
-            logger.info(f"Loaded {len(backup_proxies)} backup proxies")
-            all_proxies.extend(backup_proxies)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        logger.warning(f"Failed to load backup proxies: {e}")
-        backup_proxies = []
+        due = list(unseen(await asyncio.to_thread(db.load_due_proxies, max_due)))
+        stats['final'] = scrape_task is None
+        for proxy in due:
+            yield proxy
 
-    all_proxies.extend(new_proxies)
-    all_proxies = random.sample(all_proxies, 700)
-    unique_proxies = list({f"{p['ip_address']}:{p['port']}": p for p in all_proxies}.values())
-    logger.info(f"Total unique proxies to check: {len(unique_proxies)}")
+        if scrape_task is None:
+            return
+        try:
+            new_proxies = await scrape_task
+            logger.info(f"Scraped {len(new_proxies)} new proxies")
+        except Exception as e:
+            logger.error(f"Scraping failed: {e}", exc_info=True)
+            new_proxies = []
+            logger.info("Continuing with database and backup proxies")
+        await asyncio.to_thread(lambda: db.schedule_candidates(unknown(valid_candidates(new_proxies))))
+        # Scraped candidates are now durable in proxy_health, so a restart does not need to scrape again
+        db.save_state('last_scrape', time.time())
+        due = list(unseen(await asyncio.to_thread(db.load_due_proxies, max_due + len(seen))))
+        stats['final'] = True
+        for proxy in due:
+            yield proxy
+    finally:
+        if scrape_task is not None:
+            scrape_task.cancel()
+        logger.info(f"Total unique proxies queued for check: {stats['total']}")
 
-    if not unique_proxies:
-        logger.warning("No proxies to check, skipping proxy check")
-        return
+async def process_proxies(config: Dict[str, Any], checker: 'ProxyChecker', socketio, scrape: bool = True,
+                          known: Optional[CandidateSet] = None) -> None:
+    logger.debug("Starting process_proxies")
+    db = checker.db
 
     logger.debug("Starting proxy check")
+    expected: Dict[str, Any] = {}
     try:
-        await checker.run(unique_proxies, socketio)
+        await checker.run(iter_candidates(config, db, scrape, known if known is not None else CandidateSet(), expected),
+                          socketio, expected)
         logger.debug("Proxy check completed")
     except Exception as e:
         logger.error(f"Proxy check failed: {e}", exc_info=True)
-    db.cleanup_old_proxies(config['proxy']['ttl'])
+    scheduler = config.get('scheduler', {})
+    await asyncio.to_thread(db.cleanup_old_proxies, config['proxy']['ttl'],
+                            scheduler.get('forget_after_failures', 8), scheduler.get('forget_after', 1209600))
     logger.debug("Old proxies cleaned up")
+    held_back = await asyncio.to_thread(db.failure_summary)
+    if held_back:
+        reasons = ', '.join(f"{reason}: {count}" for reason, count in sorted(held_back.items(), key=lambda item: -item[1]))
+        logger.info(f"{sum(held_back.values())} failing candidates are waiting out their backoff ({reasons})")
 
-async def periodic_check(config: Dict[str, Any], socketio) -> None:
+async def periodic_check(config: Dict[str, Any], socketio, db: ProxyDatabase) -> None:
+    from proxy_checker import ProxyChecker
     logger.debug("Initializing ProxyChecker")
-    checker = ProxyChecker(config['proxy'], ProxyDatabase(config['database']['file']))
-    while True:
-        try:
-            logger.info("Starting periodic proxy check")
-            start_time = time.perf_counter()
-            await process_proxies(config, checker, socketio)
-            logger.info(f"Periodic check completed in {time.perf_counter() - start_time:.2f}s")
-        except Exception as e:
-            logger.error(f"Periodic check failed: {e}", exc_info=True)
-        logger.debug("Sleeping for 30 minutes")
-        await asyncio.sleep(1800)  # 30 minutes
+    checker = ProxyChecker(config['proxy'], db)
+    scheduler = config.get('scheduler', {})
+    cycle_interval = scheduler.get('cycle_interval', 60)
+    scrape_interval = scheduler.get('scrape_interval', 1800)
+    # An interrupted cycle resumes by itself: candidates that were not checked yet are still due in
+    # proxy_health. Only the scrape time needs a checkpoint to avoid re-scraping after every restart.
+    last_scrape = db.load_state('last_scrape')
+    if last_scrape is not None:
+        logger.info(f"Resuming scheduler, last scrape finished {time.time() - last_scrape:.0f}s ago")
+    known = CandidateSet()  # Candidates already registered with the scheduler during this run
+    try:
+        while True:
+            try:
+                scrape = last_scrape is None or time.time() - last_scrape >= scrape_interval
+                if scrape:
+                    last_scrape = time.time()
+                logger.info(f"Starting scheduled proxy check (scrape: {scrape})")
+                start_time = time.perf_counter()
+                await process_proxies(config, checker, socketio, scrape, known)
+                logger.info(f"Scheduled check completed in {time.perf_counter() - start_time:.2f}s")
+            except Exception as e:
+                logger.error(f"Periodic check failed: {e}", exc_info=True)
+            logger.debug(f"Sleeping for {cycle_interval}s")
+            await asyncio.sleep(cycle_interval)
+    finally:
+        checker.close()  # Shard processes are kept between cycles
 
-def main():
+def main(checker_only: bool = False):
     logger.debug("Starting main function")
     try:
         logger.debug("Loading configuration")
         config = load_config()
         logger.debug("Configuration loaded successfully")
         setup_logging(config['logging']['file'])
+        # Asked from our own judge, the address would be whatever NAT or Docker shows locally,
+        # often a private one, and every proxy would then be classified against the wrong address
+        if config.get('judge', {}).get('enabled') and not config['proxy'].get('own_ip'):
+            raise ValueError("proxy.own_ip must be set to our public address when judge.enabled is true")
         
-        logger.debug("Creating Flask app and SocketIO")
-        app, socketio = create_app()
-        logger.debug("Starting Flask thread")
-        flask_thread = Thread(target=lambda: socketio.run(app, host='0.0.0.0', port=5000, debug=True, use_reloader=False, allow_unsafe_werkzeug=True), daemon=True)
-        flask_thread.start()
+        db = ProxyDatabase(config['database']['file'], config['database'].get('pool_size', 5))
+        if checker_only:
+            from progress import StoredEventEmitter
+            # The API is served by api_server.py, which forwards progress events stored in the database
+            socketio = StoredEventEmitter(db)
+            # Checker metrics live in this process, so they get a listener of their own
+            metrics_config = config.get('metrics', {})
+            if metrics_config.get('port'):
+                from metrics import start_metrics_server
+                try:
+                    start_metrics_server(metrics_config.get('host', '0.0.0.0'), metrics_config['port'])
+                except OSError as e:
+                    logger.error(f"Failed to start metrics listener: {e}")
+        else:
+            from web_app import create_app
+            logger.debug("Creating Flask app and SocketIO")
+            app, socketio = create_app(config, db)
+            web = config.get('web', {})
+            # Single-process mode for local use; production runs --checker-only plus gunicorn (see Dockerfile)
+            logger.debug("Starting Flask thread")
+            flask_thread = Thread(target=lambda: socketio.run(app, host=web.get('host', '0.0.0.0'), port=web.get('port', 5000), use_reloader=False, allow_unsafe_werkzeug=True), daemon=True)
+            flask_thread.start()
+
+        judge = config.get('judge', {})
+        if judge.get('enabled'):
+            from judge import start_judge
+            start_judge(judge.get('host', '0.0.0.0'), judge.get('port', 8899))
+            if judge.get('public_url'):
+                config['proxy']['test_url'] = judge['public_url']
+            else:
+                logger.warning("judge.public_url is not set, proxies keep using proxy.test_url")
         
         logger.debug("Running periodic check")
-        asyncio.run(periodic_check(config, socketio))
+        asyncio.run(periodic_check(config, socketio, db))
     except KeyboardInterrupt:
         logger.info("Program terminated by user")
         sys.exit(0)
@@ -120,9 +232,15 @@ def main():
 
 if __name__ == "__main__":
     logger = logging.getLogger(__name__)
+    # Orchestrators stop containers with SIGTERM; handle it like Ctrl+C so pending check results are flushed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     # Set SelectorEventLoopPolicy on Windows to fix aiodns issue
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
         logger.debug("Set WindowsSelectorEventLoopPolicy for aiodns compatibility")
+    parser = argparse.ArgumentParser(description="Scrape and check proxies, serving them over the web API")
+    parser.add_argument('--checker-only', action='store_true',
+                        help="run only the checker/scheduler; serve the API separately with api_server.py")
+    args = parser.parse_args()
     logger.debug("Program started")
-    main()
\ No newline at end of file
+    main(args.checker_only)
\ No newline at end of file
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from typing import Dict, Any, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000)
+
+
+class ProgressReporter:
+    # Per-check calls only bump counters; snapshots are emitted (and the progress bar redrawn)
+    # at a fixed rate, so monitoring cost does not grow with the number of checks
+    def __init__(self, emit: Callable[[str, Dict[str, Any]], None], interval: float = 1.0,
+                 show_bar: bool = True, event: str = 'progress_update', expected: Optional[Dict[str, Any]] = None):
+        self.emit = emit
+        self.interval = interval
+        self.event = event
+        self.bar = None
+        if show_bar:
+            from tqdm import tqdm  # Not needed for headless runs
+            self.bar = tqdm(desc="Checking proxies")
+        self.queued = 0
+        # Filled in by the candidate source: 'total' announced so far, 'final' once nothing more will come.
+        # queued alone only runs a queue length ahead of the workers and says nothing about the end.
+        self.expected = expected if expected is not None else {}
+        self.exhausted = False
+        self.checked = 0
+        self.working = 0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.started = time.monotonic()
+        self._last_time = self.started
+        self._last_checked = 0
+        self._bar_checked = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, ok: bool, latency_ms: Optional[float] = None) -> None:
+        self.checked += 1
+        if ok:
+            self.working += 1
+        if latency_ms is not None:
+            self.histogram[bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        elapsed = now - self.started
+        window = now - self._last_time
+        rate = (self.checked - self._last_checked) / window if window > 0 else 0.0
+        average_rate = self.checked / elapsed if elapsed > 0 else 0.0
+        self._last_time, self._last_checked = now, self.checked
+        final = self.exhausted or self.expected.get('final', False)
+        total = self.queued if self.exhausted else max(self.queued, self.expected.get('total', 0))
+        remaining = max(total - self.checked, 0)
+        return {
+            'current_step': self.checked,
+            'total_steps': total,
+            'working_proxies': self.working,
+            'checks_per_sec': round(rate, 1),
+            'success_rate': round(self.working / self.checked, 4) if self.checked else 0.0,
+            'latency_histogram': {
+                'buckets_ms': list(LATENCY_BUCKETS_MS),
+                'counts': list(self.histogram)
+            },
+            'eta_seconds': round(remaining / average_rate, 1) if final and average_rate > 0 else None,
+            'elapsed_seconds': round(elapsed, 1)
+        }
+
+    def publish(self) -> None:
+        if self.bar is not None:
+            self.bar.update(self.checked - self._bar_checked)
+            self._bar_checked = self.checked
+        try:
+            self.emit(self.event, self.snapshot())
+        except Exception as e:
+            logger.warning(f"Failed to publish progress: {e}")
+
+    async def _publish_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.publish()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._publish_periodically())
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        self.publish()
+        if self.bar is not None:
+            self.bar.close()
+
+
+class StoredEventEmitter:
+    # Used in place of the Socket.IO server when the API runs in separate processes:
+    # events go to the shared database and the API workers forward them to clients
+    def __init__(self, db):
+        self.db = db
+
+    def emit(self, event: str, payload: Dict[str, Any]) -> None:
+        self.db.save_event(event, payload)
@@ -0,0 +1,60 @@
+import gzip
+import json
+import logging
+import time
+from threading import Lock
+from typing import List, Dict, Any, Optional
+from database import ProxyDatabase
+
+logger = logging.getLogger(__name__)
+
+
+def format_proxy(proxy: Dict[str, Any], now: float) -> Dict[str, Any]:
+    return {
+        'ip_address': proxy['ip_address'],
+        'port': proxy['port'],
+        'delay_ms': round(proxy['delay_ms'], 2) if proxy['delay_ms'] is not None else 0.0,
+        'country': proxy['country'],
+        'updated_timestamp': proxy['updated'],
+        'updated_minutes_ago': f"{round(max(0.0, now - proxy['updated']) / 60, 1)} минут",
+        'anonymity': proxy['anonymity'],
+        'protocol': proxy['protocol']
+    }
+
+
+class ProxySnapshot:
+    def __init__(self, version: int, bucket: int, proxies: List[Dict[str, Any]]):
+        self.version = version
+        self.bucket = bucket
+        self.proxies = proxies
+        self.json = json.dumps(proxies).encode('utf-8')
+        self.json_gzip = gzip.compress(self.json, compresslevel=6)
+        # Depends only on shared state, so every API worker process serves the same ETag
+        self.etag = f"v{version}-{bucket}"
+
+
+class ProxySnapshotCache:
+    # Rebuilt only when ProxyDatabase reports a new data version, or when the clock enters a new
+    # max_age bucket so that the relative "updated N minutes ago" values do not drift too far.
+    # The values are computed at the bucket start, not at build time, to keep workers consistent.
+    def __init__(self, db: ProxyDatabase, ttl: float, max_age: float = 30):
+        self.db = db
+        self.ttl = ttl
+        self.max_age = max_age
+        self._snapshot: Optional[ProxySnapshot] = None
+        self._lock = Lock()
+
+    def get(self) -> ProxySnapshot:
+        snapshot = self._snapshot
+        version = self.db.version
+        bucket = int(time.time() // self.max_age)
+        if snapshot is not None and snapshot.version == version and snapshot.bucket == bucket:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version or snapshot.bucket != bucket:
+                proxies = [format_proxy(p, bucket * self.max_age) for p in self.db.load_proxies(self.ttl)]
+                snapshot = ProxySnapshot(version, bucket, proxies)
+                self._snapshot = snapshot
+                logger.debug(f"Rebuilt proxy snapshot {snapshot.etag} with {len(proxies)} proxies")
+            return snapshot
@@ -1,23 +1,67 @@
 import asyncio
 import aiohttp
+import json
 import logging
+import logging.handlers
+import multiprocessing
+import os
+import queue
+import sys
 import time
-from typing import List, Dict, Any, Optional
-from tqdm import tqdm
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable, AsyncIterable, AsyncIterator, Union, Tuple, Callable
+from progress import ProgressReporter
+from metrics import REGISTRY
 from database import ProxyDatabase
+from geoip import create_country_resolver
+from judge import classify_anonymity
+from proxy_protocols import SUPPORTED_PROTOCOLS, ProxyProtocolError, TunnelProber
 import ipaddress
 
 logger = logging.getLogger(__name__)
 
+SHARD_CHUNK_SIZE = 256  # Candidates per task message and results per reply message between processes
+SHARD_EXIT = 'exit'  # Task message that stops a shard process; None only ends the current run
+
+# Probe-level metrics are recorded in the process that runs the probe, so with sharded checking
+# only the parent-side counters (checks, run duration) reach the /metrics endpoint
+CHECK_DURATION = REGISTRY.histogram('proxy_check_duration_seconds', 'Duration of a single protocol probe',
+                                    ['protocol', 'result'])
+CHECK_ERRORS = REGISTRY.counter('proxy_check_errors_total', 'Failed protocol probes by error class',
+                                ['protocol', 'error'])
+PREFILTER = REGISTRY.counter('proxy_prefilter_total', 'TCP pre-filter results', ['result'])
+CHECKS = REGISTRY.counter('proxy_checks_total', 'Checked candidates by outcome', ['result'])
+CHECK_RUN_DURATION = REGISTRY.histogram('proxy_check_run_duration_seconds', 'Duration of a full check run',
+                                        buckets=(10, 30, 60, 120, 300, 600, 1200, 1800, 3600))
+
 class ProxyChecker:
-    def __init__(self, config: Dict[str, Any], db: ProxyDatabase):
+    def __init__(self, config: Dict[str, Any], db: Optional[ProxyDatabase]):
         self.test_url = config['test_url']
         self.max_workers = config['max_workers']
         self.request_timeout = config['request_timeout']
+        self.connect_timeout = config.get('connect_timeout', 1.5)
+        self.prefilter_workers = config.get('prefilter_workers', 0)
         self.max_delay_ms = config['max_delay_ms']
         self.ip_api_concurrency = config['ip_api_concurrency']
+        self.queue_size = config.get('queue_size', self.max_workers * 4)
+        self.batch_size = config.get('batch_size', 100)
+        self.flush_interval = config.get('flush_interval', 2)
+        self.progress_interval = config.get('progress_interval', 1)
+        self.progress_bar = config.get('progress_bar', True)
+        self.success_interval = config.get('success_interval', 900)
+        self.base_backoff = config.get('base_backoff', 1800)
+        self.max_backoff = config.get('max_backoff', 604800)
+        self.processes = config.get('processes', 1) or os.cpu_count() or 1
+        self.own_ip = config.get('own_ip')  # Our public address; discovered from the judge when not set
+        self.config = config
         self.db = db
-        self.working_proxies: List[Dict[str, Any]] = []
+        self.country_resolver = create_country_resolver(config)
+        self.protocols = [p for p in config.get('protocols', ['http']) if p in SUPPORTED_PROTOCOLS] or ['http']
+        unsupported = set(config.get('protocols', [])) - set(SUPPORTED_PROTOCOLS)
+        if unsupported:
+            logger.warning(f"Ignoring unsupported proxy protocols: {', '.join(sorted(unsupported))}")
+        self.tunnel_prober = TunnelProber(self.test_url)
+        self._shards: List[multiprocessing.Process] = []
         logger.debug("ProxyChecker initialized")
 
     def _validate_ip(self, ip: str) -> bool:
@@ -29,106 +73,448 @@ class ProxyChecker:
             return False
 
     async def _get_country(self, ip: str, session: aiohttp.ClientSession) -> str:
-        async with asyncio.Semaphore(self.ip_api_concurrency):
-            try:
+        return await self.country_resolver.resolve(ip, session)
+
+    async def _probe(self, proxy: Dict[str, Any], protocol: str, session: aiohttp.ClientSession,
+                     errors: Dict[str, str]) -> Optional[Tuple[float, Dict[str, Any]]]:
+        proxy_str = f"{protocol}://{proxy['ip_address']}:{proxy['port']}"
+        start_time = time.perf_counter()
+        error = None
+        try:
+            if protocol == 'http':
+                # Plain HTTP proxies go through the shared aiohttp session and its connection pool
                 async with session.get(
-                    f"http://ip-api.com/json/{ip}",
-                    timeout=self.request_timeout
+                    self.test_url,
+                    proxy=f"http://{proxy['ip_address']}:{proxy['port']}",
+                    timeout=self.request_timeout,
+                    ssl=False
                 ) as response:
-                    logger.debug(f"IP API response for {ip}: {response.status}")
-                    if response.status == 200:
-                        data = await response.json()
-                        return data.get("country", "Unknown") if data.get("status") == "success" else "Unknown"
-                    logger.info(f"IP API returned status {response.status} for {ip}")
-                    return "Unknown"
-            except Exception as e:
-                logger.info(f"Error fetching country for IP {ip}: {e}")
-                return "Unknown"
-
-    async def check_proxy(self, proxy: Dict[str, Any], session: aiohttp.ClientSession) -> Optional[Dict[str, Any]]:
-        if not self._validate_ip(proxy['ip_address']):
-            return None
+                    elapsed_time = (time.perf_counter() - start_time) * 1000
+                    status = response.status
+                    body = await response.read() if status == 200 else b""
+            else:
+                status, _, body = await asyncio.wait_for(
+                    self.tunnel_prober.fetch(protocol, proxy['ip_address'], proxy['port']),
+                    self.request_timeout
+                )
+                elapsed_time = (time.perf_counter() - start_time) * 1000
 
-        proxy_str = f"{proxy['ip_address']}:{proxy['port']}"
-        proxy_url = f"http://{proxy_str}"
-        logger.debug(f"Checking proxy {proxy_str}")
+            logger.debug(f"Response for {proxy_str}: {status}, Delay: {elapsed_time:.2f}ms")
+            if status != 200 or elapsed_time > self.max_delay_ms:
+                logger.debug(f"Proxy {proxy_str} failed: Status {status}, Delay: {elapsed_time:.2f}ms")
+                error = f"status_{status}" if status != 200 else 'too_slow'
+                return None
 
-        try:
-            start_time = time.perf_counter()
-            async with session.get(
-                self.test_url,
-                proxy=proxy_url,
-                timeout=self.request_timeout,
-                ssl=False
-            ) as response:
-                elapsed_time = (time.perf_counter() - start_time) * 1000
-                logger.debug(f"Response for {proxy_str}: {response.status}, Delay: {elapsed_time:.2f}ms")
-                if response.status != 200 or elapsed_time > self.max_delay_ms:
-                    logger.debug(f"Proxy {proxy_str} failed: Status {response.status}, Delay: {elapsed_time:.2f}ms")
-                    return None
-
-                data = await response.json()
-                if not isinstance(data, dict) or 'origin' not in data:
-                    logger.debug(f"Proxy {proxy_str} returned invalid JSON")
-                    return None
-
-                origin_ip = data['origin']
-                anonymity = 'elite' if origin_ip != proxy['ip_address'] else 'transparent'
-                country = await self._get_country(proxy['ip_address'], session)
-
-                result = {
-                    "ip_address": proxy['ip_address'],
-                    "port": proxy['port'],
-                    "delay_ms": elapsed_time,
-                    "country": country,
-                    "updated": time.time(),
-                    "anonymity": anonymity,
-                    "protocol": "http"
-                }
-                logger.info(f"Proxy {proxy_str} is working: Delay {elapsed_time:.2f}ms, Anonymity: {anonymity}")
-                return result
-        except (aiohttp.ClientProxyConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError) as e:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+            if not isinstance(data, dict) or 'origin' not in data:
+                logger.debug(f"Proxy {proxy_str} returned invalid JSON")
+                error = 'invalid_json'
+                return None
+            return elapsed_time, data
+        except (aiohttp.ClientProxyConnectionError, aiohttp.ClientResponseError, asyncio.TimeoutError,
+                asyncio.IncompleteReadError, asyncio.LimitOverrunError, ProxyProtocolError, OSError) as e:
             logger.debug(f"Proxy {proxy_str} error: {e}")
+            error = type(e).__name__
             return None
         except Exception as e:
             logger.info(f"Unexpected error checking proxy {proxy_str}: {e}")
+            error = type(e).__name__
             return None
+        finally:
+            CHECK_DURATION.observe(time.perf_counter() - start_time, protocol=protocol,
+                                   result='error' if error else 'ok')
+            if error:
+                CHECK_ERRORS.inc(protocol=protocol, error=error)
+                errors[protocol] = error
 
-    async def run(self, proxies: List[Dict[str, Any]], socketio) -> None:
-        logger.debug(f"Starting proxy check with {len(proxies)} proxies")
-        if not proxies:
-            logger.warning("No proxies to check")
-            return
+    async def check_proxy(self, proxy: Dict[str, Any], session: aiohttp.ClientSession) -> List[Dict[str, Any]]:
+        if not self._validate_ip(proxy['ip_address']):
+            proxy['error'] = 'invalid_ip'
+            return []
 
-        self.working_proxies.clear()
-        start_time = time.perf_counter()
-        success_count = 0
-        semaphore = asyncio.Semaphore(self.max_workers)
+        proxy_str = f"{proxy['ip_address']}:{proxy['port']}"
+        logger.debug(f"Checking proxy {proxy_str} for {', '.join(self.protocols)}")
 
-        async def check_with_semaphore(proxy: Dict[str, Any], session: aiohttp.ClientSession):
-            async with semaphore:
-                return await self.check_proxy(proxy, session)
+        errors: Dict[str, str] = {}
+        probes = await asyncio.gather(*(self._probe(proxy, protocol, session, errors) for protocol in self.protocols))
+        # Kept on the candidate so a failed check can be stored with its reason; the probes finish in
+        # any order, so the reported one is the first failing protocol in config order
+        for protocol in self.protocols:
+            if protocol in errors:
+                proxy['error'] = f"{protocol}:{errors[protocol]}"
+                break
+        if not any(probes):
+            return []
+
+        country = await self._get_country(proxy['ip_address'], session)
+        results = []
+        for protocol, probe in zip(self.protocols, probes):
+            if probe is None:
+                continue
+            elapsed_time, data = probe
+            anonymity = classify_anonymity(data, proxy['ip_address'], self.own_ip)
+            results.append({
+                "ip_address": proxy['ip_address'],
+                "port": proxy['port'],
+                "delay_ms": elapsed_time,
+                "country": country,
+                "updated": time.time(),
+                "anonymity": anonymity,
+                "protocol": protocol
+            })
+            logger.info(f"Proxy {protocol}://{proxy_str} is working: Delay {elapsed_time:.2f}ms, Anonymity: {anonymity}")
+        return results
+
+    async def _discover_own_ip(self) -> None:
+        # A direct request to the judge shows the address proxies would leak as ours
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(self.test_url, timeout=self.request_timeout, ssl=False) as response:
+                    data = await response.json(content_type=None)
+            self.own_ip = str(data['origin']).split(',')[0].strip()
+            logger.info(f"Own public IP according to the judge: {self.own_ip}")
+        except Exception as e:
+            logger.warning(f"Could not determine own IP from {self.test_url}, anonymity falls back to origin check: {e}")
+
+    async def _tcp_reachable(self, proxy: Dict[str, Any]) -> bool:
+        if not self._validate_ip(proxy['ip_address']):
+            return False
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(proxy['ip_address'], proxy['port']),
+                self.connect_timeout
+            )
+        except (OSError, asyncio.TimeoutError, ValueError):
+            return False
+        writer.close()
+        return True
+
+    async def _check_stream(self, proxies: AsyncIterator[Dict[str, Any]],
+                            on_result: Callable[[Dict[str, Any], List[Dict[str, Any]]], None]) -> None:
+        # Stage one (optional): a bare TCP connect with a short timeout and high concurrency drops
+        # unreachable candidates. Stage two: only survivors get the full protocol/anonymity check.
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        candidates: asyncio.Queue = asyncio.Queue(maxsize=max(self.queue_size, self.prefilter_workers * 2))
+
+        async def produce() -> None:
+            target = candidates if self.prefilter_workers else queue
+            # Stop markers are sent only when the input is exhausted: on cancellation or an error the
+            # consumers are cancelled too, and a put on the full bounded queue would never return
+            async for proxy in proxies:
+                await target.put(proxy)
+            for _ in range(self.prefilter_workers or self.max_workers):
+                await target.put(None)
+
+        async def prefilter() -> None:
+            while True:
+                proxy = await candidates.get()
+                if proxy is None:
+                    return
+                if await self._tcp_reachable(proxy):
+                    PREFILTER.inc(result='reachable')
+                    await queue.put(proxy)
+                else:
+                    PREFILTER.inc(result='unreachable')
+                    proxy['error'] = 'unreachable'
+                    on_result(proxy, [])
+
+        async def close_stage_two(prefilters: List[asyncio.Task]) -> None:
+            await asyncio.gather(*prefilters)
+            for _ in range(self.max_workers):
+                await queue.put(None)
+
+        async def worker(session: aiohttp.ClientSession) -> None:
+            while True:
+                proxy = await queue.get()
+                if proxy is None:
+                    return
+                on_result(proxy, await self.check_proxy(proxy, session))
 
         async with aiohttp.ClientSession(
             connector=aiohttp.TCPConnector(limit=self.max_workers)
         ) as session:
-            tasks = [check_with_semaphore(proxy, session) for proxy in proxies]
-            logger.debug(f"Created {len(tasks)} proxy check tasks")
-            for i, future in enumerate(tqdm(
-                asyncio.as_completed(tasks),
-                total=len(proxies),
-                desc="Checking proxies"
-            )):
-                result = await future
-                if result:
-                    self.working_proxies.append(result)
-                    success_count += 1
-                socketio.emit('progress_update', {
-                    'current_step': i + 1,
-                    'total_steps': len(proxies),
-                    'working_proxies': len(self.working_proxies)
-                })
-
-        self.db.save_proxies(self.working_proxies)
+            producer = asyncio.create_task(produce())
+            workers = [asyncio.create_task(worker(session)) for _ in range(self.max_workers)]
+            if self.prefilter_workers:
+                prefilters = [asyncio.create_task(prefilter()) for _ in range(self.prefilter_workers)]
+                workers += prefilters + [asyncio.create_task(close_stage_two(prefilters))]
+            logger.debug(f"Started {self.max_workers} proxy check workers and {self.prefilter_workers} TCP pre-filters")
+            try:
+                await asyncio.gather(producer, *workers)
+            finally:
+                producer.cancel()
+                for task in workers:
+                    task.cancel()
+
+    def _start_shards(self) -> None:
+        # The shard pool is kept across runs: spawning re-imports aiohttp and reloads the GeoIP table
+        # in every shard, which would cost more than a short cycle. A pool with a dead shard is replaced.
+        if self._shards and all(shard.is_alive() for shard in self._shards):
+            return
+        self._stop_shards(graceful=False)
+        context = multiprocessing.get_context('spawn')
+        self._tasks = context.Queue(maxsize=self.processes * 4)
+        self._results = context.Queue()
+        # Shard log records are handed to the handlers configured in this process
+        log_queue = context.Queue()
+        root = logging.getLogger()
+        self._log_listener = logging.handlers.QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+        self._log_listener.start()
+        shard_config = dict(self.config, own_ip=self.own_ip)
+        self._starts = [context.Event() for _ in range(self.processes)]
+        self._shards = [context.Process(target=_shard_main,
+                                        args=(shard_config, i, self._tasks, self._results, self._starts[i], log_queue,
+                                              root.getEffectiveLevel()),
+                                        name=f"ProxyCheckShard-{i}", daemon=True) for i in range(self.processes)]
+        for shard in self._shards:
+            shard.start()
+        logger.debug(f"Started {len(self._shards)} proxy check shard processes")
+
+    def _stop_shards(self, graceful: bool) -> None:
+        if not self._shards:
+            return
+        if graceful:
+            for _ in self._shards:
+                try:
+                    self._tasks.put_nowait(SHARD_EXIT)
+                except queue.Full:
+                    break
+            for start in self._starts:
+                start.set()
+        for shard in self._shards:
+            if graceful:
+                shard.join(timeout=5)
+            if shard.is_alive():
+                shard.terminate()
+        self._shards = []
+        self._log_listener.stop()
+
+    def close(self) -> None:
+        # Stops the shard processes kept between sharded runs
+        self._stop_shards(graceful=True)
+
+    async def _run_sharded(self, proxies: AsyncIterator[Dict[str, Any]],
+                           on_result: Callable[[Dict[str, Any], List[Dict[str, Any]]], None]) -> None:
+        # Candidates are handed out in chunks through a shared queue, so idle shards pull more work;
+        # each shard runs its own event loop and session and only sends compact result tuples back
+        proxies = proxies.__aiter__()
+        try:
+            first = await proxies.__anext__()
+        except StopAsyncIteration:
+            return  # An empty cycle does not need the shards
+        self._start_shards()
+        shards, tasks, results = self._shards, self._tasks, self._results
+        for start in self._starts:
+            start.set()
+        loop = asyncio.get_running_loop()
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ProxyCheckShardIO")
+        # Candidates handed to the shards and not reported back yet; whatever is left here when the
+        # shards are done was lost with a shard that died and is checked again in this process
+        outstanding: Dict[Tuple[str, int], None] = {}
+
+        def put(item: Optional[List[Tuple[str, int]]]) -> bool:
+            # A blocking put would wait forever once no shard is left to drain the queue
+            while True:
+                try:
+                    tasks.put(item, True, 1.0)
+                    return True
+                except queue.Full:
+                    if not any(shard.is_alive() for shard in shards):
+                        return False
+
+        async def feed() -> bool:
+            # Returns False when the shards died before all candidates were handed out
+            chunk = [(first['ip_address'], first['port'])]
+            async for proxy in proxies:
+                chunk.append((proxy['ip_address'], proxy['port']))
+                if len(chunk) >= SHARD_CHUNK_SIZE:
+                    outstanding.update(dict.fromkeys(chunk))
+                    if not await loop.run_in_executor(executor, put, chunk):
+                        return False
+                    chunk = []
+            if chunk:
+                outstanding.update(dict.fromkeys(chunk))
+                if not await loop.run_in_executor(executor, put, chunk):
+                    return False
+            # One end-of-run marker per shard, sent only once every candidate was handed out
+            for _ in shards:
+                if not await loop.run_in_executor(executor, put, None):
+                    break
+            return True
+
+        async def collect() -> None:
+            finished = set()
+            while len(finished) < len(shards):
+                try:
+                    message = await loop.run_in_executor(executor, results.get, True, 1.0)
+                except queue.Empty:
+                    dead = [i for i, shard in enumerate(shards) if i not in finished and not shard.is_alive()]
+                    if dead and len(finished) + len(dead) == len(shards):
+                        logger.error(f"{len(dead)} proxy check shard(s) exited unexpectedly")
+                        return
+                    continue
+                if isinstance(message, int):
+                    finished.add(message)  # The shard with this index is done with the run
+                    continue
+                for ip, port, proxy_results, error in message:
+                    outstanding.pop((ip, port), None)
+                    on_result({'ip_address': ip, 'port': port, 'error': error}, proxy_results)
+
+        try:
+            delivered, _ = await asyncio.gather(feed(), collect())
+        except BaseException:
+            # Shards stopped in the middle of a run cannot be reused
+            self._stop_shards(graceful=False)
+            raise
+        finally:
+            executor.shutdown(wait=False)
+        if not all(shard.is_alive() for shard in shards):
+            # Unconsumed chunks and markers of the dead shard would leak into the next run
+            self._stop_shards(graceful=False)
+
+        if outstanding or not delivered:
+            logger.warning(f"Proxy check shards exited early, checking {len(outstanding)} lost"
+                           f"{'' if delivered else ' and all remaining'} candidates in this process")
+
+            async def leftovers() -> AsyncIterator[Dict[str, Any]]:
+                for ip, port in list(outstanding):
+                    yield {'ip_address': ip, 'port': port}
+                if not delivered:
+                    async for proxy in proxies:
+                        yield proxy
+
+            await self._check_stream(leftovers(), on_result)
+    async def run(self, proxies: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]], socketio,
+                  expected: Optional[Dict[str, Any]] = None) -> None:
+        logger.debug(f"Starting streaming proxy check with {self.max_workers} workers in {self.processes} process(es)")
+        start_time = time.perf_counter()
+        batch: List[Dict[str, Any]] = []
+        outcomes: List[Dict[str, Any]] = []
+        dead: List[Tuple[str, int, str]] = []
+        progress = ProgressReporter(socketio.emit, self.progress_interval, self.progress_bar, expected=expected)
+        if self.own_ip is None:
+            await self._discover_own_ip()
+
+        def flush() -> None:
+            if batch:
+                self.db.save_proxies(batch)
+                batch.clear()
+            if dead:
+                self.db.remove_proxies(dead)
+                dead.clear()
+            if outcomes:
+                self.db.record_checks(outcomes, self.success_interval, self.base_backoff, self.max_backoff)
+                outcomes.clear()
+
+        async def flush_periodically() -> None:
+            # Bounds how long a result can wait in memory when the batch fills up slowly
+            while True:
+                await asyncio.sleep(self.flush_interval)
+                flush()
+
+        async def counted() -> AsyncIterator[Dict[str, Any]]:
+            if hasattr(proxies, '__aiter__'):
+                async for proxy in proxies:
+                    progress.queued += 1
+                    yield proxy
+            else:
+                for proxy in proxies:
+                    progress.queued += 1
+                    yield proxy
+            progress.exhausted = True
+
+        def record(proxy: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+            outcomes.append({'ip_address': proxy['ip_address'], 'port': proxy['port'], 'ok': bool(results),
+                             'error': proxy.get('error')})
+            CHECKS.inc(result='working' if results else 'failed')
+            progress.record(bool(results), min(result['delay_ms'] for result in results) if results else None)
+            if results:
+                batch.extend(results)
+            working_protocols = {result['protocol'] for result in results}
+            # Previously stored rows for protocols that just failed stop being served right away
+            dead.extend((proxy['ip_address'], proxy['port'], protocol)
+                        for protocol in self.protocols if protocol not in working_protocols)
+            if len(batch) >= self.batch_size or len(outcomes) >= self.batch_size * 10:
+                flush()
+
+        flusher = asyncio.create_task(flush_periodically())
+        progress.start()
+        try:
+            if self.processes > 1:
+                await self._run_sharded(counted(), record)
+            else:
+                await self._check_stream(counted(), record)
+        finally:
+            flusher.cancel()
+            progress.close()
+            flush()
+            await asyncio.to_thread(self.db.flush)
+
+        if not progress.queued:
+            logger.warning("No proxies to check")
+            return
         total_time = time.perf_counter() - start_time
-        logger.info(f"Checked {len(proxies)} proxies in {total_time:.2f}s, Found {success_count} working")
\ No newline at end of file
+        CHECK_RUN_DURATION.observe(total_time)
+        logger.info(f"Checked {progress.checked} proxies in {total_time:.2f}s, Found {progress.working} working")
+
+
+def _shard_main(config: Dict[str, Any], index: int, tasks, results, start, log_queue, log_level: int) -> None:
+    # Spawned processes start without the parent's logging setup
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(log_level)
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(_shard_loop(config, index, tasks, results, start))
+
+
+async def _shard_loop(config: Dict[str, Any], index: int, tasks, results, start) -> None:
+    checker = ProxyChecker(dict(config, processes=1), None)
+    loop = asyncio.get_running_loop()
+    pending: List[Tuple[str, int, List[Dict[str, Any]], Optional[str]]] = []
+    exiting = False
+
+    def send() -> None:
+        if pending:
+            results.put(list(pending))
+            pending.clear()
+
+    def on_result(proxy: Dict[str, Any], proxy_results: List[Dict[str, Any]]) -> None:
+        pending.append((proxy['ip_address'], proxy['port'], proxy_results, proxy.get('error')))
+        if len(pending) >= SHARD_CHUNK_SIZE:
+            send()
+
+    async def candidates() -> AsyncIterator[Dict[str, Any]]:
+        nonlocal exiting
+        while True:
+            chunk = await loop.run_in_executor(None, tasks.get)
+            if chunk is None:
+                return  # End of the current run
+            if chunk == SHARD_EXIT:
+                exiting = True
+                return
+            for ip, port in chunk:
+                yield {'ip_address': ip, 'port': port}
+
+    async def send_periodically() -> None:
+        while True:
+            await asyncio.sleep(0.2)
+            send()
+
+    # One _check_stream per run of the parent, until the parent closes the pool. Waiting for the
+    # start signal keeps a shard that finished early from taking another shard's end-of-run marker.
+    while True:
+        await loop.run_in_executor(None, start.wait)
+        start.clear()
+        sender = asyncio.create_task(send_periodically())
+        try:
+            await checker._check_stream(candidates(), on_result)
+        finally:
+            sender.cancel()
+            send()
+        if exiting:
+            return
+        results.put(index)
\ No newline at end of file
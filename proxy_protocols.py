@@ -0,0 +1,132 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+import ssl
+import struct
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_PROTOCOLS = ('http', 'https', 'socks4', 'socks5')
+TUNNEL_PROTOCOLS = ('https', 'socks4', 'socks5')
+MAX_RESPONSE_BYTES = 65536
+
+
+class ProxyProtocolError(Exception):
+    pass
+
+
+class TunnelProber:
+    # Speaks HTTP CONNECT, SOCKS4 and SOCKS5 directly over asyncio streams, so every
+    # protocol is verified with a single lightweight TCP connection and no extra dependencies
+    def __init__(self, test_url: str, user_agent: str = "Mozilla/5.0"):
+        parts = urlsplit(test_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        self.user_agent = user_agent
+        self.ssl_context = ssl.create_default_context() if self.scheme == 'https' else None
+        self._host_ipv4 = None
+        self._request = (
+            f"GET {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}\r\n"
+            f"User-Agent: {self.user_agent}\r\n"
+            "Accept: */*\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode()
+
+    async def _resolve_host_ipv4(self) -> bytes:
+        # SOCKS4 (without the 4a extension) needs the target as an IPv4 address; resolved once
+        if self._host_ipv4 is None:
+            try:
+                self._host_ipv4 = ipaddress.IPv4Address(self.host).packed
+            except ValueError:
+                infos = await asyncio.get_running_loop().getaddrinfo(self.host, self.port, family=socket.AF_INET)
+                self._host_ipv4 = socket.inet_aton(infos[0][4][0])
+        return self._host_ipv4
+
+    async def _connect_tunnel(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, protocol: str) -> None:
+        if protocol == 'https':
+            writer.write(
+                f"CONNECT {self.host}:{self.port} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n\r\n".encode()
+            )
+            await writer.drain()
+            head = await reader.readuntil(b"\r\n\r\n")
+            status_line = head.split(b"\r\n", 1)[0].split()
+            if len(status_line) < 2 or status_line[1] != b"200":
+                raise ProxyProtocolError(f"CONNECT rejected: {head[:64]!r}")
+        elif protocol == 'socks4':
+            writer.write(struct.pack('>BBH', 4, 1, self.port) + await self._resolve_host_ipv4() + b"\x00")
+            await writer.drain()
+            reply = await reader.readexactly(8)
+            if reply[1] != 0x5A:
+                raise ProxyProtocolError(f"SOCKS4 request rejected: code {reply[1]}")
+        elif protocol == 'socks5':
+            writer.write(b"\x05\x01\x00")
+            await writer.drain()
+            reply = await reader.readexactly(2)
+            if reply != b"\x05\x00":
+                raise ProxyProtocolError(f"SOCKS5 auth negotiation failed: {reply!r}")
+            host = self.host.encode('idna')
+            writer.write(b"\x05\x01\x00\x03" + bytes([len(host)]) + host + struct.pack('>H', self.port))
+            await writer.drain()
+            reply = await reader.readexactly(4)
+            if reply[1] != 0x00:
+                raise ProxyProtocolError(f"SOCKS5 connect rejected: code {reply[1]}")
+            if reply[3] == 0x01:
+                await reader.readexactly(4 + 2)
+            elif reply[3] == 0x04:
+                await reader.readexactly(16 + 2)
+            elif reply[3] == 0x03:
+                length = (await reader.readexactly(1))[0]
+                await reader.readexactly(length + 2)
+            else:
+                raise ProxyProtocolError(f"SOCKS5 unknown address type {reply[3]}")
+        else:
+            raise ProxyProtocolError(f"Unsupported tunnel protocol {protocol}")
+
+    @staticmethod
+    def _parse_response(raw: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        head, sep, body = raw.partition(b"\r\n\r\n")
+        if not sep:
+            raise ProxyProtocolError("Incomplete HTTP response")
+        lines = head.decode('latin-1').split("\r\n")
+        status_parts = lines[0].split(None, 2)
+        if len(status_parts) < 2 or not status_parts[1].isdigit():
+            raise ProxyProtocolError(f"Invalid status line: {lines[0][:64]}")
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            decoded = b""
+            while body:
+                size_line, _, rest = body.partition(b"\r\n")
+                size = int(size_line.split(b";")[0] or b"0", 16)
+                if size == 0:
+                    break
+                decoded += rest[:size]
+                body = rest[size + 2:]
+            body = decoded
+        return int(status_parts[1]), headers, body
+
+    async def fetch(self, protocol: str, proxy_ip: str, proxy_port: int) -> Tuple[int, Dict[str, str], bytes]:
+        reader, writer = await asyncio.open_connection(proxy_ip, proxy_port)
+        try:
+            await self._connect_tunnel(reader, writer, protocol)
+            if self.ssl_context is not None:
+                await writer.start_tls(self.ssl_context, server_hostname=self.host)
+            writer.write(self._request)
+            await writer.drain()
+            raw = await reader.read(MAX_RESPONSE_BYTES)
+            while raw and len(raw) < MAX_RESPONSE_BYTES:
+                chunk = await reader.read(MAX_RESPONSE_BYTES - len(raw))
+                if not chunk:
+                    break
+                raw += chunk
+            return self._parse_response(raw)
+        finally:
+            writer.close()
@@ -1,56 +1,216 @@
 import asyncio
 import aiohttp
+import json
 import logging
-from typing import List, Dict, Any
-from bs4 import BeautifulSoup
+import re
+import time
+from typing import List, Dict, Any, Callable, Optional, Tuple, Union
+from urllib.parse import urlsplit
+import lxml.html
+from metrics import REGISTRY
 
 logger = logging.getLogger(__name__)
 
-async def scrape_proxies(urls: List[str], user_agent: str, timeout: float) -> List[Dict[str, Any]]:
-    logger.debug(f"Starting scrape_proxies with {len(urls)} URLs")
-    headers = {'User-Agent': user_agent}
-    all_proxies = []
+IP_RE = re.compile(r'(?:25[0-5]|2[0-4]\d|1?\d?\d)(?:\.(?:25[0-5]|2[0-4]\d|1?\d?\d)){3}')
+PROXY_RE = re.compile(rb'(?<![\d.])(\d{1,3}(?:\.\d{1,3}){3})(?:\s*:\s*|\s+)(\d{2,5})(?!\d)')
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
-    async def scrape_single(url: str) -> List[Dict[str, Any]]:
-        proxies = []
-        logger.debug(f"Scraping URL: {url}")
-        async with aiohttp.ClientSession() as session:
+SCRAPE_DURATION = REGISTRY.histogram('proxy_scrape_duration_seconds', 'Time to fetch and parse one proxy source',
+                                     ['source', 'result'])
+SCRAPE_ROWS = REGISTRY.counter('proxy_scrape_rows_total', 'Proxy rows extracted per source', ['source'])
+
+Extractor = Callable[[bytes, Dict[str, Any]], List[Dict[str, Any]]]
+EXTRACTORS: Dict[str, Extractor] = {}
+
+
+def register_extractor(name: str) -> Callable[[Extractor], Extractor]:
+    def decorator(func: Extractor) -> Extractor:
+        EXTRACTORS[name] = func
+        return func
+    return decorator
+
+
+def _make_proxy(ip: str, port: Any) -> Optional[Dict[str, Any]]:
+    ip = ip.strip()
+    try:
+        port = int(str(port).strip())
+    except ValueError:
+        return None
+    if not IP_RE.fullmatch(ip) or not 0 < port < 65536:
+        return None
+    return {"ip_address": ip, "port": port}
+
+
+@register_extractor('table')
+def extract_table(body: bytes, source: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # First two cells of every row matched by the XPath hold the IP address and the port
+    document = lxml.html.fromstring(body)
+    proxies = []
+    for row in document.xpath(source.get('xpath', '(//table)[1]//tr')):
+        cells = row.xpath('./td')
+        if len(cells) >= 2:
+            proxy = _make_proxy(cells[0].text_content(), cells[1].text_content())
+            if proxy:
+                proxies.append(proxy)
+    return proxies
+
+
+@register_extractor('regex')
+def extract_regex(body: bytes, source: Dict[str, Any]) -> List[Dict[str, Any]]:
+    pattern = re.compile(source['pattern'].encode()) if 'pattern' in source else PROXY_RE
+    proxies = []
+    for match in pattern.finditer(body):
+        proxy = _make_proxy(match.group(1).decode(), match.group(2).decode())
+        if proxy:
+            proxies.append(proxy)
+    return proxies
+
+
+@register_extractor('json')
+def extract_json(body: bytes, source: Dict[str, Any]) -> List[Dict[str, Any]]:
+    data = json.loads(body)
+    for key in source.get('items_path', []):
+        data = data[key]
+    ip_key = source.get('ip_key', 'ip')
+    port_key = source.get('port_key', 'port')
+    proxies = []
+    for item in data if isinstance(data, list) else []:
+        if isinstance(item, dict) and ip_key in item and port_key in item:
+            proxy = _make_proxy(str(item[ip_key]), item[port_key])
+            if proxy:
+                proxies.append(proxy)
+    return proxies
+
+
+@register_extractor('auto')
+def extract_auto(body: bytes, source: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Proxy list sites mostly use an HTML table; plain-text lists fall back to the regex
+    proxies = extract_table(body, source) if b'<table' in body[:200000].lower() else []
+    return proxies or extract_regex(body, source)
+
+
+class ProxyScraper:
+    # Keeps ETag/Last-Modified validators, the last parsed result and per-host backoff
+    # across scrape rounds, so unchanged pages cost a 304 and no parsing
+    def __init__(self, max_retries: int = 2, base_backoff: float = 1.0, max_backoff: float = 60.0,
+                 limit_per_host: int = 2):
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.limit_per_host = limit_per_host
+        self.validators: Dict[str, Tuple[Optional[str], Optional[str], List[Dict[str, Any]]]] = {}
+        self.host_backoff: Dict[str, float] = {}
+        self.host_next_allowed: Dict[str, float] = {}
+
+    def _record_failure(self, host: str) -> float:
+        delay = min(self.max_backoff, self.host_backoff.get(host, self.base_backoff / 2) * 2)
+        self.host_backoff[host] = delay
+        self.host_next_allowed[host] = time.monotonic() + delay
+        return delay
+
+    def _record_success(self, host: str) -> None:
+        self.host_backoff.pop(host, None)
+        self.host_next_allowed.pop(host, None)
+
+    async def _fetch(self, session: aiohttp.ClientSession, url: str, headers: Dict[str, str],
+                     timeout: float) -> Tuple[int, Optional[bytes], Optional[str], Optional[str]]:
+        host = urlsplit(url).hostname or url
+        etag, last_modified, _ = self.validators.get(url, (None, None, []))
+        request_headers = dict(headers)
+        if etag:
+            request_headers['If-None-Match'] = etag
+        if last_modified:
+            request_headers['If-Modified-Since'] = last_modified
+
+        status = 0
+        for attempt in range(self.max_retries + 1):
+            wait = self.host_next_allowed.get(host, 0) - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
             try:
-                async with session.get(url, headers=headers, timeout=timeout) as response:
-                    logger.debug(f"Response status for {url}: {response.status}")
-                    if response.status != 200:
-                        logger.warning(f"Failed to fetch {url}: Status {response.status}")
-                        return []
-                    soup = BeautifulSoup(await response.text(), 'lxml')
-                    table = soup.find('table')
-                    if not table:
-                        logger.warning(f"No proxy table found on {url}")
-                        return []
-
-                    for row in table.find_all('tr')[1:]:
-                        cols = row.find_all('td')
-                        if len(cols) >= 2:
-                            try:
-                                ip = cols[0].text.strip()
-                                port = int(cols[1].text.strip())
-                                proxies.append({"ip_address": ip, "port": port})
-                            except ValueError as e:
-                                logger.debug(f"Error parsing row on {url}: {e}")
-                        await asyncio.sleep(0.05)  # Minimal delay to avoid rate-limiting
-                    logger.info(f"Scraped {len(proxies)} proxies from {url}")
-                    return proxies
-            except Exception as e:
-                logger.error(f"Error scraping {url}: {e}", exc_info=True)
+                async with session.get(url, headers=request_headers, timeout=timeout) as response:
+                    status = response.status
+                    logger.debug(f"Response status for {url}: {status}")
+                    if status == 304:
+                        self._record_success(host)
+                        return status, None, etag, last_modified
+                    if status == 200:
+                        body = await response.read()
+                        self._record_success(host)
+                        return status, body, response.headers.get('ETag'), response.headers.get('Last-Modified')
+                    if status not in RETRY_STATUSES:
+                        return status, None, None, None
+                    retry_after = response.headers.get('Retry-After', '')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(f"Fetch attempt {attempt + 1} for {url} failed: {e}")
+                retry_after = ''
+            delay = self._record_failure(host)
+            if retry_after.isdigit():
+                self.host_next_allowed[host] = time.monotonic() + min(self.max_backoff, float(retry_after))
+            if attempt < self.max_retries:
+                logger.debug(f"Retrying {url} after {delay:.1f}s backoff")
+        return status, None, None, None
+
+    async def scrape_source(self, session: aiohttp.ClientSession, source: Dict[str, Any],
+                            headers: Dict[str, str], timeout: float) -> List[Dict[str, Any]]:
+        url = source['url']
+        host = urlsplit(url).hostname or url
+        logger.debug(f"Scraping URL: {url}")
+        start_time = time.perf_counter()
+        extractor = EXTRACTORS.get(source.get('parser', 'auto'))
+        if extractor is None:
+            logger.error(f"Unknown parser {source.get('parser')} for {url}")
+            return []
+        try:
+            status, body, etag, last_modified = await self._fetch(session, url, headers, timeout)
+            if status == 304 and url in self.validators:
+                proxies = self.validators[url][2]
+                logger.info(f"{url} not modified, reusing {len(proxies)} proxies")
+                SCRAPE_DURATION.observe(time.perf_counter() - start_time, source=host, result='not_modified')
+                return proxies
+            if body is None:
+                logger.warning(f"Failed to fetch {url}: Status {status}")
+                SCRAPE_DURATION.observe(time.perf_counter() - start_time, source=host, result='failed')
                 return []
+            proxies = await asyncio.to_thread(extractor, body, source)
+            self.validators[url] = (etag, last_modified, proxies)
+            if not proxies:
+                logger.warning(f"No proxies found on {url}")
+            logger.info(f"Scraped {len(proxies)} proxies from {url}")
+            SCRAPE_DURATION.observe(time.perf_counter() - start_time, source=host, result='ok')
+            SCRAPE_ROWS.inc(len(proxies), source=host)
+            return proxies
+        except Exception as e:
+            logger.error(f"Error scraping {url}: {e}", exc_info=True)
+            SCRAPE_DURATION.observe(time.perf_counter() - start_time, source=host, result='error')
+            return []
+
+    async def scrape(self, sources: List[Union[str, Dict[str, Any]]], user_agent: str,
+                     timeout: float) -> List[Dict[str, Any]]:
+        sources = [{'url': s} if isinstance(s, str) else s for s in sources]
+        logger.debug(f"Starting scrape with {len(sources)} sources")
+        headers = {'User-Agent': user_agent, 'Accept-Encoding': 'gzip, deflate'}
+        all_proxies = []
+
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit_per_host=self.limit_per_host, ttl_dns_cache=300)
+        ) as session:
+            results = await asyncio.gather(
+                *(self.scrape_source(session, source, headers, timeout) for source in sources),
+                return_exceptions=True
+            )
+        for result in results:
+            if isinstance(result, list):
+                all_proxies.extend(result)
+            else:
+                logger.error(f"Scrape task failed: {result}")
+
+        logger.debug(f"Total proxies scraped: {len(all_proxies)}")
+        return all_proxies
+
+
+_default_scraper = ProxyScraper()
+
 
-    tasks = [scrape_single(url) for url in urls]
-    logger.debug(f"Created {len(tasks)} scraping tasks")
-    results = await asyncio.gather(*tasks, return_exceptions=True)
-    for result in results:
-        if isinstance(result, list):
-            all_proxies.extend(result)
-        else:
-            logger.error(f"Scrape task failed: {result}")
-
-    logger.debug(f"Total proxies scraped: {len(all_proxies)}")
-    return all_proxies
\ No newline at end of file
+async def scrape_proxies(urls: List[Union[str, Dict[str, Any]]], user_agent: str, timeout: float) -> List[Dict[str, Any]]:
+    return await _default_scraper.scrape(urls, user_agent, timeout)
\ No newline at end of file
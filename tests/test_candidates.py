@@ -0,0 +1,69 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from candidates import CandidateSet, iter_json_array, pack_candidate
+
+
+class CandidateSetTest(unittest.TestCase):
+    def test_matches_builtin_set_across_merges(self):
+        rng = random.Random(1)
+        candidates = CandidateSet(merge_threshold=50)
+        candidates.MERGE_WINDOW = 64  # Several windows per merge
+        expected = set()
+        for _ in range(5000):
+            candidate = (f"10.0.{rng.randrange(8)}.{rng.randrange(256)}", rng.randrange(1, 20))
+            self.assertEqual(candidates.add(*candidate), candidate not in expected)
+            expected.add(candidate)
+        self.assertEqual(len(candidates), len(expected))
+        self.assertEqual(list(candidates._sorted), sorted(candidates._sorted))
+        for candidate in expected:
+            self.assertIn(candidate, candidates)
+        self.assertNotIn(('10.0.0.1', 20), candidates)
+
+    def test_non_ipv4_candidates(self):
+        candidates = CandidateSet()
+        for ip in ('::1', 'proxy.example', '1.2.3', '01.2.3.4'):
+            self.assertIsNone(pack_candidate(ip, 80))
+            self.assertTrue(candidates.add(ip, 80))
+            self.assertFalse(candidates.add(ip, 80))
+        self.assertIsNone(pack_candidate('1.2.3.4', 65536))
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'backup.json')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def parse(self, text, chunk_size=7):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return list(iter_json_array(self.path, chunk_size))
+
+    def test_matches_json_load_across_chunk_edges(self):
+        items = [{'ip_address': f'10.0.0.{i}', 'port': 8000 + i, 'note': 'a, "b" ] c'} for i in range(20)]
+        items += [2.5, -1e3, 'x', None, [1, [2]], {}]
+        text = json.dumps(items, indent=1)
+        for chunk_size in (1, 2, 3, 7, 64, 65536):
+            self.assertEqual(self.parse(text, chunk_size), items)
+
+    def test_empty_array(self):
+        self.assertEqual(self.parse(' [ ] '), [])
+
+    def test_malformed_input(self):
+        for text in ('{"a": 1}', '[1, 2', '[1 2]', '[1,]', ''):
+            with self.assertRaises(json.JSONDecodeError, msg=text):
+                self.parse(text)
+
+
+if __name__ == '__main__':
+    unittest.main()
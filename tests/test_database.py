@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from threading import Thread
+from unittest import mock
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database import ProxyDatabase
+
+OLD_SCHEMA = '''CREATE TABLE proxies
+                (ip_address TEXT, port INTEGER, delay_ms REAL, country TEXT, updated REAL,
+                 anonymity TEXT, protocol TEXT, PRIMARY KEY (ip_address, port))'''
+
+
+class ProtocolKeyMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.tmp.name, 'proxies.db')
+        self.now = time.time()
+        conn = sqlite3.connect(self.db_file)
+        conn.execute(OLD_SCHEMA)
+        conn.execute('CREATE INDEX idx_updated ON proxies(updated)')
+        conn.executemany('INSERT INTO proxies VALUES (?, ?, ?, ?, ?, ?, ?)', [
+            ('1.1.1.1', 80, 100.0, 'DE', self.now, 'elite', 'http'),
+            ('2.2.2.2', 8080, 200.0, 'US', self.now, 'transparent', None),
+        ])
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def table_names(self):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+        finally:
+            conn.close()
+
+    def test_migrates_rows_to_protocol_key(self):
+        db = ProxyDatabase(self.db_file)
+        try:
+            rows = {(p['ip_address'], p['port'], p['protocol']) for p in db.load_proxies(3600)}
+            self.assertEqual(rows, {('1.1.1.1', 80, 'http'), ('2.2.2.2', 8080, 'http')})
+            db.save_proxies([{'ip_address': '1.1.1.1', 'port': 80, 'delay_ms': 50.0, 'country': 'DE',
+                              'updated': self.now, 'anonymity': 'elite', 'protocol': 'socks5'}])
+            db.flush()
+            self.assertEqual(len(db.load_proxies(3600)), 3)
+        finally:
+            db.close()
+        names = self.table_names()
+        self.assertNotIn('proxies_unmigrated', names)
+        self.assertIn('idx_updated', names)
+
+    def test_recovers_interrupted_migration(self):
+        # State left by the earlier migration when it stopped right after the rename
+        conn = sqlite3.connect(self.db_file)
+        conn.execute('ALTER TABLE proxies RENAME TO proxies_old')
+        conn.commit()
+        conn.close()
+
+        db = ProxyDatabase(self.db_file)
+        try:
+            self.assertEqual(len(db.load_proxies(3600)), 2)
+        finally:
+            db.close()
+        self.assertNotIn('proxies_old', self.table_names())
+
+    def test_concurrent_first_start(self):
+        results = []
+
+        def start():
+            try:
+                db = ProxyDatabase(self.db_file)
+                results.append(len(db.load_proxies(3600)))
+                db.close()
+            except Exception as e:
+                results.append(e)
+
+        threads = [Thread(target=start) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [2] * 5)
+
+
+class WriterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = ProxyDatabase(os.path.join(self.tmp.name, 'proxies.db'))
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_writer_survives_unbindable_values(self):
+        # A port beyond SQLite's integer range raises OverflowError, not sqlite3.Error
+        self.assertEqual(self.db.schedule_candidates([{'ip_address': '2.2.2.2', 'port': 10 ** 20}]), 0)
+        self.assertEqual(self.db.schedule_candidates([{'ip_address': '3.3.3.3', 'port': 3128}]), 1)
+        self.db.save_proxies([{'ip_address': '3.3.3.3', 'port': 3128, 'delay_ms': 10.0, 'country': 'DE',
+                               'updated': time.time(), 'anonymity': 'elite', 'protocol': 'http'}])
+        self.db.flush()
+        self.assertEqual(len(self.db.load_proxies(3600)), 1)
+
+
+class PoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = ProxyDatabase(os.path.join(self.tmp.name, 'proxies.db'), pool_size=1)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_exhausted_pool_is_a_handled_database_error(self):
+        with mock.patch('database.POOL_TIMEOUT', 0.1), self.db._get_connection():
+            self.assertEqual(self.db.load_proxies(3600), [])
+            self.assertRaises(sqlite3.OperationalError, lambda: self.db.version)
+
+    def test_failed_connect_frees_its_slot(self):
+        self.db.conn_pool.get_nowait().close()
+        self.db.conn_count = 0
+        with mock.patch.object(self.db, '_connect', side_effect=sqlite3.OperationalError('unable to open')):
+            self.assertEqual(self.db.load_due_proxies(10), [])
+        self.assertEqual(self.db.conn_count, 0)
+        self.assertEqual(self.db.load_due_proxies(10), [])
+
+
+class HealthTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = ProxyDatabase(os.path.join(self.tmp.name, 'proxies.db'))
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def record(self, ip, *results):
+        for ok in results:
+            self.db.record_checks([{'ip_address': ip, 'port': 80, 'ok': ok, 'error': None if ok else 'http:timeout'}],
+                                  900, 1800, 604800)
+        self.db.flush()
+
+    def health(self):
+        with self.db._get_connection() as conn:
+            return {row['ip_address']: dict(row) for row in conn.execute('SELECT * FROM proxy_health')}
+
+    def test_backoff_doubles_up_to_max_and_resets_on_success(self):
+        # success_interval 900, base_backoff 1800, max_backoff 604800
+        backoffs = []
+        for _ in range(10):
+            self.record('1.1.1.1', False)
+            backoffs.append(self.health()['1.1.1.1']['backoff'])
+        self.assertEqual(backoffs, [1800, 3600, 7200, 14400, 28800, 57600, 115200, 230400, 460800, 604800])
+        row = self.health()['1.1.1.1']
+        self.assertEqual((row['failures'], row['consecutive_failures'], row['last_error']), (10, 10, 'http:timeout'))
+        self.assertAlmostEqual(row['next_check'] - row['last_checked'], 604800)
+
+        self.record('1.1.1.1', True)
+        row = self.health()['1.1.1.1']
+        self.assertEqual((row['successes'], row['consecutive_failures'], row['backoff']), (1, 0, 900))
+        self.assertIsNone(row['last_error'])
+        self.assertAlmostEqual(row['next_check'] - row['last_checked'], 900)
+
+        # The first failure after a success starts again at base_backoff
+        self.record('1.1.1.1', False)
+        self.assertEqual(self.health()['1.1.1.1']['backoff'], 1800)
+
+    def test_cleanup_forgets_dead_candidates(self):
+        self.record('1.1.1.1', False, False, False)  # Never worked
+        self.record('2.2.2.2', False, False)  # Never worked, not enough failures yet
+        self.record('3.3.3.3', True, False)  # Failing since a success long ago
+        self.record('4.4.4.4', True, False)  # Failing since a recent success
+        conn = sqlite3.connect(self.db.db_file)
+        conn.execute("UPDATE proxy_health SET last_success = ? WHERE ip_address = '3.3.3.3'", (time.time() - 86400,))
+        conn.commit()
+        conn.close()
+
+        self.db.cleanup_old_proxies(3600, max_failures=3, forget_after=3600)
+        self.assertEqual(set(self.health()), {'2.2.2.2', '4.4.4.4'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from geoip import UNKNOWN_COUNTRY, OfflineCountryResolver, create_country_resolver
+
+# DB-IP lite layout (dotted addresses) mixed with IP2Location LITE rows (integer addresses)
+TABLE = '''ip_from,ip_to,country_code
+"1.0.0.0","1.0.0.255","au"
+"2.0.0.0","2.255.255.255","FR"
+134744064,134744319,US
+"3.0.0.0","3.0.0.255","ZZ"
+"4.0.0.0","4.0.0.255","-"
+"2001:db8::","2001:db8::ffff","DE"
+'''
+
+
+class OfflineCountryResolverTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.table = os.path.join(self.tmp.name, 'geoip.csv')
+        with open(self.table, 'w', encoding='utf-8') as f:
+            f.write(TABLE)
+        self.resolver = OfflineCountryResolver(self.table)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lookup_returns_iso_codes(self):
+        self.assertEqual(self.resolver.lookup('1.0.0.0'), 'AU')
+        self.assertEqual(self.resolver.lookup('1.0.0.255'), 'AU')
+        self.assertEqual(self.resolver.lookup('2.128.0.1'), 'FR')
+        self.assertEqual(self.resolver.lookup('8.8.8.8'), 'US')  # 134744064 = 8.8.8.0
+
+    def test_lookup_misses(self):
+        for ip in ('1.0.1.0', '0.0.0.1', '255.255.255.255', '3.0.0.1', '4.0.0.1', '2001:db8::1', 'not-an-ip'):
+            self.assertIsNone(self.resolver.lookup(ip), ip)
+        self.assertEqual(len(self.resolver.starts), 5)  # Header and IPv6 rows are skipped
+
+    def test_resolver_without_table_or_fallback(self):
+        resolver = create_country_resolver({'geoip_file': os.path.join(self.tmp.name, 'missing.csv')})
+        self.assertEqual(asyncio.run(resolver.resolve('1.0.0.1', None)), UNKNOWN_COUNTRY)
+        resolver = create_country_resolver({'geoip_file': self.table})
+        self.assertEqual(asyncio.run(resolver.resolve('1.0.0.1', None)), 'AU')
+
+
+if __name__ == '__main__':
+    unittest.main()
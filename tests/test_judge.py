@@ -0,0 +1,39 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from judge import classify_anonymity
+
+OWN_IP = '203.0.113.10'
+PROXY_IP = '198.51.100.7'
+
+
+class ClassifyAnonymityTest(unittest.TestCase):
+    def test_elite_without_proxy_headers(self):
+        data = {'origin': PROXY_IP, 'headers': {'Host': 'judge', 'User-Agent': 'x'}}
+        self.assertEqual(classify_anonymity(data, PROXY_IP, OWN_IP), 'elite')
+
+    def test_anonymous_when_proxy_announces_itself(self):
+        data = {'origin': PROXY_IP, 'headers': {'Via': '1.1 squid', 'X-Forwarded-For': 'unknown'}}
+        self.assertEqual(classify_anonymity(data, PROXY_IP, OWN_IP), 'anonymous')
+
+    def test_transparent_when_own_ip_leaks(self):
+        for data in ({'origin': f'{OWN_IP}, {PROXY_IP}', 'headers': {}},
+                     {'origin': PROXY_IP, 'headers': {'X-Forwarded-For': f'{OWN_IP}, 10.0.0.1'}},
+                     {'origin': PROXY_IP, 'headers': {'forwarded': f'for="{OWN_IP}";proto=http'}}):
+            self.assertEqual(classify_anonymity(data, PROXY_IP, OWN_IP), 'transparent', data)
+
+    def test_own_ip_as_prefix_is_not_a_leak(self):
+        # 203.0.113.1 must not match inside 203.0.113.10
+        data = {'origin': PROXY_IP, 'headers': {'X-Forwarded-For': OWN_IP}}
+        self.assertEqual(classify_anonymity(data, PROXY_IP, '203.0.113.1'), 'anonymous')
+
+    def test_fallback_origin_comparison_without_own_ip(self):
+        self.assertEqual(classify_anonymity({'origin': PROXY_IP}, PROXY_IP, None), 'transparent')
+        self.assertEqual(classify_anonymity({'origin': '192.0.2.1'}, PROXY_IP, None), 'elite')
+
+
+if __name__ == '__main__':
+    unittest.main()
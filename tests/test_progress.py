@@ -0,0 +1,39 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from progress import ProgressReporter
+
+
+class ProgressSnapshotTest(unittest.TestCase):
+    def reporter(self, expected=None) -> ProgressReporter:
+        reporter = ProgressReporter(lambda event, data: None, show_bar=False, expected=expected)
+        reporter.started -= 10  # Pretend the run has been going for ten seconds
+        reporter.queued = 20
+        for _ in range(10):
+            reporter.record(True, 150)
+        return reporter
+
+    def test_no_eta_while_total_unknown(self):
+        snapshot = self.reporter().snapshot()
+        self.assertEqual(snapshot['total_steps'], 20)
+        self.assertIsNone(snapshot['eta_seconds'])
+
+    def test_announced_total_drives_eta(self):
+        snapshot = self.reporter({'total': 110, 'final': True}).snapshot()
+        self.assertEqual(snapshot['total_steps'], 110)
+        self.assertAlmostEqual(snapshot['eta_seconds'], 100, delta=1)
+
+    def test_exhausted_source_uses_queued(self):
+        reporter = self.reporter({'total': 20, 'final': False})
+        reporter.exhausted = True
+        snapshot = reporter.snapshot()
+        self.assertEqual(snapshot['total_steps'], 20)
+        self.assertAlmostEqual(snapshot['eta_seconds'], 10, delta=1)
+        self.assertEqual(snapshot['latency_histogram']['counts'][1], 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
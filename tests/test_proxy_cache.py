@@ -0,0 +1,47 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database import ProxyDatabase
+from proxy_cache import ProxySnapshotCache
+
+
+class SnapshotEtagTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = ProxyDatabase(os.path.join(self.tmp.name, 'proxies.db'))
+        self.db.save_proxies([{'ip_address': '1.1.1.1', 'port': 80, 'delay_ms': 50.0, 'country': 'DE',
+                               'updated': time.time() - 120, 'anonymity': 'elite', 'protocol': 'http'}])
+        self.db.flush()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmp.cleanup()
+
+    def test_separate_caches_agree(self):
+        # Each API worker process has its own cache; built at different times, they must still match
+        first = ProxySnapshotCache(self.db, 3600, max_age=3600).get()
+        time.sleep(1.1)
+        second = ProxySnapshotCache(self.db, 3600, max_age=3600).get()
+        if first.bucket == second.bucket:
+            self.assertEqual(first.etag, second.etag)
+            self.assertEqual(first.json, second.json)
+
+    def test_new_data_version_changes_etag(self):
+        cache = ProxySnapshotCache(self.db, 3600, max_age=3600)
+        before = cache.get()
+        self.db.save_proxies([{'ip_address': '2.2.2.2', 'port': 8080, 'delay_ms': 70.0, 'country': 'US',
+                               'updated': time.time(), 'anonymity': 'elite', 'protocol': 'http'}])
+        self.db.flush()
+        after = cache.get()
+        self.assertNotEqual(before.etag, after.etag)
+        self.assertEqual(len(after.proxies), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
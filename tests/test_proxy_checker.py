@@ -0,0 +1,166 @@
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from database import ProxyDatabase
+from proxy_checker import ProxyChecker
+
+
+class NullSocketIO:
+    def emit(self, event, data):
+        pass
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def stalled_listener() -> socket.socket:
+    # Connections are accepted by the kernel but never served, so full checks stall until cancelled
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen(128)
+    return sock
+
+
+class CancelRunTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = ProxyDatabase(os.path.join(self.tmp.name, 'proxies.db'))
+        self.stalled = stalled_listener()
+
+    def tearDown(self):
+        self.stalled.close()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def checker(self) -> ProxyChecker:
+        return ProxyChecker({
+            'test_url': 'http://127.0.0.1:1/', 'max_workers': 2, 'request_timeout': 30, 'max_delay_ms': 1000,
+            'ip_api_concurrency': 1, 'queue_size': 2, 'prefilter_workers': 2, 'flush_interval': 60,
+            'own_ip': '127.0.0.2', 'progress_bar': False, 'geoip_file': os.path.join(self.tmp.name, 'geoip.csv')
+        }, self.db)
+
+    def test_cancelled_run_finishes_and_flushes(self):
+        refused = closed_port()
+        stalled = self.stalled.getsockname()[1]
+        candidates = [{'ip_address': '127.0.0.1', 'port': refused}]
+        candidates += [{'ip_address': '127.0.0.1', 'port': stalled} for _ in range(50)]
+
+        async def scenario() -> bool:
+            asyncio.create_task(self.checker().run(candidates, NullSocketIO()))
+            await asyncio.sleep(1)
+            # What asyncio.run does on KeyboardInterrupt (SIGTERM in main.py): cancel every task once
+            tasks = asyncio.all_tasks() - {asyncio.current_task()}
+            for task in tasks:
+                task.cancel()
+            try:
+                await asyncio.wait_for(asyncio.gather(*tasks, return_exceptions=True), 10)
+                return True
+            except asyncio.TimeoutError:
+                return False
+
+        self.assertTrue(asyncio.run(scenario()), "cancelled run did not finish")
+        # The refused candidate was only buffered in memory when the run was cancelled
+        self.assertEqual(self.db.failure_summary(), {'unreachable': 1})
+
+
+class FailureReasonTest(unittest.TestCase):
+    def test_reason_follows_protocol_order(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            checker = ProxyChecker({
+                'test_url': 'http://127.0.0.1:1/', 'max_workers': 1, 'request_timeout': 1, 'max_delay_ms': 1000,
+                'ip_api_concurrency': 1, 'own_ip': '127.0.0.2', 'protocols': ['http', 'socks4', 'socks5'],
+                'geoip_file': os.path.join(tmp, 'geoip.csv')
+            }, None)
+
+        async def probe(proxy, protocol, session, errors):
+            # socks5 fails first in time, http last; socks4 works
+            await asyncio.sleep({'http': 0.05, 'socks4': 0.02, 'socks5': 0}[protocol])
+            if protocol != 'socks4':
+                errors[protocol] = f'{protocol}_error'
+                return None
+            return 10.0, {'origin': '192.0.2.1'}
+
+        async def check() -> dict:
+            proxy = {'ip_address': '192.0.2.1', 'port': 1080}
+            checker._probe = probe
+            results = await checker.check_proxy(proxy, None)
+            self.assertEqual([result['protocol'] for result in results], ['socks4'])
+            return proxy
+
+        self.assertEqual(asyncio.run(check())['error'], 'http:http_error')
+
+
+class ShardPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = ProxyDatabase(os.path.join(self.tmp.name, 'proxies.db'))
+        self.checker = ProxyChecker({
+            'test_url': 'http://127.0.0.1:1/', 'max_workers': 5, 'request_timeout': 30, 'max_delay_ms': 1000,
+            'ip_api_concurrency': 1, 'processes': 2, 'own_ip': '127.0.0.2', 'progress_bar': False,
+            'geoip_file': os.path.join(self.tmp.name, 'geoip.csv')
+        }, self.db)
+        self.stalled = [stalled_listener() for _ in range(20)]
+
+    def tearDown(self):
+        self.checker.close()
+        for sock in self.stalled:
+            sock.close()
+        self.db.close()
+        self.tmp.cleanup()
+
+    def checked(self) -> int:
+        with self.db._get_connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM proxy_health WHERE last_checked IS NOT NULL').fetchone()[0]
+
+    def test_empty_run_starts_no_shards(self):
+        asyncio.run(self.checker.run([], NullSocketIO()))
+        self.assertEqual(self.checker._shards, [])
+
+    def test_pool_is_kept_between_runs(self):
+        candidates = [{'ip_address': '127.0.0.1', 'port': closed_port()}]
+        asyncio.run(self.checker.run(candidates, NullSocketIO()))
+        pids = [shard.pid for shard in self.checker._shards]
+        asyncio.run(self.checker.run(candidates, NullSocketIO()))
+        self.assertEqual([shard.pid for shard in self.checker._shards], pids)
+        self.assertEqual(len(pids), 2)
+
+    def test_candidates_of_killed_shards_are_checked_in_process(self):
+        candidates = [{'ip_address': '127.0.0.1', 'port': sock.getsockname()[1]} for sock in self.stalled]
+        rechecked = []
+
+        async def fake_check_stream(proxies, on_result):
+            # Only replaces the in-process fallback; the spawned shards run the real checker
+            async for proxy in proxies:
+                rechecked.append((proxy['ip_address'], proxy['port']))
+                on_result(proxy, [])
+
+        async def scenario() -> None:
+            self.checker._check_stream = fake_check_stream
+            run = asyncio.create_task(self.checker.run(candidates, NullSocketIO()))
+            await asyncio.sleep(3)  # Shards have picked up the candidates and stall on them
+            for shard in self.checker._shards:
+                shard.kill()
+            await asyncio.wait_for(run, 30)
+
+        start = time.monotonic()
+        asyncio.run(scenario())
+        self.assertLess(time.monotonic() - start, 30)
+        self.assertEqual(sorted(rechecked), sorted((c['ip_address'], c['port']) for c in candidates))
+        self.assertEqual(self.checked(), len(candidates))
+        # The broken pool is dropped and replaced by the next sharded run
+        self.assertEqual(self.checker._shards, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
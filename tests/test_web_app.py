@@ -0,0 +1,60 @@
+import csv
+import io
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from web_app import EXPORT_COLUMNS, decode_cursor, encode_cursor, export_chunks
+
+
+def row(ip, port, protocol):
+    return {'ip_address': ip, 'port': port, 'protocol': protocol, 'anonymity': 'elite', 'country': 'DE',
+            'delay_ms': 120.5, 'updated': 1700000000.0}
+
+
+class ExportTest(unittest.TestCase):
+    ROWS = [row('1.1.1.1', 80, 'http'), row('1.1.1.1', 80, 'https'), row('1.1.1.1', 80, 'socks5'),
+            row('2.2.2.2', 3128, 'https')]
+
+    def test_txt_urls_dedupe_http_and_https(self):
+        # An https (CONNECT) row is still reached over http://, so the pair gives one URL
+        text = ''.join(export_chunks(self.ROWS, 'txt'))
+        self.assertEqual(text.splitlines(), ['http://1.1.1.1:80', 'socks5://1.1.1.1:80', 'http://2.2.2.2:3128'])
+
+    def test_txt_without_scheme_for_single_protocol(self):
+        rows = [row('1.1.1.1', 80, 'socks5'), row('2.2.2.2', 1080, 'socks5')]
+        text = ''.join(export_chunks(rows, 'txt', with_scheme=False))
+        self.assertEqual(text.splitlines(), ['1.1.1.1:80', '2.2.2.2:1080'])
+
+    def test_csv_and_ndjson_keep_every_row(self):
+        lines = list(csv.reader(io.StringIO(''.join(export_chunks(self.ROWS, 'csv')))))
+        self.assertEqual(tuple(lines[0]), EXPORT_COLUMNS)
+        self.assertEqual([line[2] for line in lines[1:]], ['http', 'https', 'socks5', 'https'])
+        items = [json.loads(line) for line in ''.join(export_chunks(self.ROWS, 'ndjson')).splitlines()]
+        self.assertEqual(items[3], self.ROWS[3])
+
+    def test_chunks_are_bounded(self):
+        rows = [row(f'10.0.{i // 256}.{i % 256}', 8080, 'http') for i in range(25)]
+        with mock.patch('web_app.EXPORT_CHUNK_ROWS', 10):
+            chunks = list(export_chunks(rows, 'txt'))
+        self.assertEqual([len(chunk.splitlines()) for chunk in chunks], [10, 10, 5])
+
+
+class CursorTest(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor(row('1.1.1.1', 80, 'socks5'), 'delay_ms')
+        self.assertNotIn('=', cursor)
+        self.assertEqual(decode_cursor(cursor), [120.5, '1.1.1.1', 80, 'socks5'])
+
+    def test_invalid_cursors(self):
+        for cursor in ('!!!', 'bm90IGpzb24', 'WzEsMl0', 'eyJhIjoxfQ'):  # Not base64, not JSON, short list, object
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,66 +1,243 @@
 
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, render_template, request, jsonify, g
 from flask_socketio import SocketIO
-from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple
+import base64
+import csv
+import io
+import json
 import secrets
+import sqlite3
 import logging
 import time
-import sqlite3
+import zlib
 from config_manager import load_config
+from database import ProxyDatabase, SORT_COLUMNS
+from proxy_cache import ProxySnapshotCache, format_proxy
+from metrics import REGISTRY
+from candidates import CandidateSet
 
 logger = logging.getLogger(__name__)
 
-def create_app() -> tuple[Flask, SocketIO]:
+FORWARDED_EVENTS = ('progress_update',)
+QUERY_PARAMS = ('country', 'anonymity', 'protocol', 'max_delay_ms', 'min_freshness', 'sort', 'limit', 'cursor')
+MAX_PAGE_SIZE = 1000
+EXPORT_FORMATS = {'txt': 'text/plain', 'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_COLUMNS = ('ip_address', 'port', 'protocol', 'anonymity', 'country', 'delay_ms', 'updated')
+EXPORT_CHUNK_ROWS = 1000  # Rows per streamed chunk and per database page
+# The https protocol is an HTTP proxy that allows CONNECT; clients still reach it over plain http://
+PROXY_URL_SCHEMES = {'https': 'http'}
+
+API_REQUEST_DURATION = REGISTRY.histogram('proxy_api_request_duration_seconds', 'Web request latency',
+                                          ['endpoint', 'method', 'status'])
+
+def parse_filters(args) -> Dict[str, Any]:
+    filters: Dict[str, Any] = {}
+    for key in ('country', 'anonymity', 'protocol'):
+        if args.get(key):
+            filters[key] = [value.strip() for value in args[key].split(',') if value.strip()]
+    for key in ('max_delay_ms', 'min_freshness'):
+        if args.get(key):
+            try:
+                filters[key] = float(args[key])
+            except ValueError:
+                raise ValueError(f"{key} must be a number")
+    return filters
+
+def parse_sort(args) -> Tuple[str, bool]:
+    sort = args.get('sort', 'delay_ms')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_COLUMNS)} (prefix with - for descending)")
+    return sort, descending
+
+def export_chunks(rows: Iterable[Dict[str, Any]], fmt: str, with_scheme: bool = True) -> Iterator[str]:
+    # txt lines are proxy URLs; the bare ip:port form is only used when a single protocol was requested
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    written = CandidateSet()  # An http and an https (CONNECT) row of one proxy give the same URL
+    if fmt == 'csv':
+        writer.writerow(EXPORT_COLUMNS)
+    for i, row in enumerate(rows, 1):
+        if fmt == 'txt':
+            if not with_scheme:
+                buffer.write(f"{row['ip_address']}:{row['port']}\n")
+            else:
+                scheme = PROXY_URL_SCHEMES.get(row['protocol'], row['protocol'])
+                if scheme != 'http' or written.add(row['ip_address'], row['port']):
+                    buffer.write(f"{scheme}://{row['ip_address']}:{row['port']}\n")
+        elif fmt == 'ndjson':
+            buffer.write(json.dumps({column: row[column] for column in EXPORT_COLUMNS}) + "\n")
+        else:
+            writer.writerow([row[column] for column in EXPORT_COLUMNS])
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def gzip_chunks(chunks: Iterable[str]) -> Iterator[bytes]:
+    # Sync flush after every chunk so clients receive data as it is produced
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+def encode_cursor(row: Dict[str, Any], sort: str) -> str:
+    key = [row[sort], row['ip_address'], row['port'], row['protocol']]
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> List[Any]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != 4:
+        raise ValueError("Invalid cursor")
+    return key
+
+def create_app(config: Optional[Dict[str, Any]] = None, db: Optional[ProxyDatabase] = None,
+               forward_events: bool = False, async_mode: Optional[str] = None) -> tuple[Flask, SocketIO]:
     app = Flask(__name__)
     app.config['SECRET_KEY'] = secrets.token_hex(16)
 
     # Try eventlet, fallback to threading if eventlet is unavailable
-    async_mode = 'eventlet'
-    try:
-        import eventlet  # Check if eventlet is installed
-        logger.info("Using eventlet for SocketIO async mode")
-    except ImportError:
-        logger.warning("eventlet not installed, falling back to threading async mode")
-        async_mode = 'threading'
+    if async_mode is None:
+        async_mode = 'eventlet'
+        try:
+            import eventlet  # Check if eventlet is installed
+            logger.info("Using eventlet for SocketIO async mode")
+        except ImportError:
+            logger.warning("eventlet not installed, falling back to threading async mode")
+            async_mode = 'threading'
 
     socketio = SocketIO(app, async_mode=async_mode, cors_allowed_origins="*")
 
-    CONFIG = load_config()
+    if config is None:
+        config = load_config()
+    if db is None:
+        db = ProxyDatabase(config['database']['file'], config['database'].get('pool_size', 5))
+    ttl = config['proxy']['ttl']
+    cache = ProxySnapshotCache(db, ttl, config.get('web', {}).get('snapshot_max_age', 30))
 
-    def load_working_proxies():
-        try:
-            with sqlite3.connect(CONFIG["database"]["file"]) as conn:
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM proxies")
-                rows = cursor.fetchall()
-                proxies = [
-                    {
-                        'ip_address': row[0],
-                        'port': row[1],
-                        'delay_ms': round(row[2], 2) if row[2] is not None else 0.0,
-                        'country': row[3],
-                        'updated_timestamp': row[4],
-                        'updated_minutes_ago': f"{round((time.time() - row[4]) / 60, 1)} минут",
-                        'anonymity': row[5],
-                        'protocol': row[6]
-                    }
-                    for row in rows
-                ]
-                logger.info(f"Loaded {len(proxies)} proxies from database")
-                return proxies
-        except sqlite3.Error as e:
-            logger.error(f"Database error: {e}")
-            return []
+    def forward_stored_events():
+        # When the checker runs in its own process it stores events in the shared database;
+        # every API worker polls them and re-emits changes to its own Socket.IO clients
+        interval = config.get('web', {}).get('event_poll_interval', 1)
+        last: Dict[str, Optional[str]] = {}
+        while True:
+            for event in FORWARDED_EVENTS:
+                value = db.load_event(event)
+                if value is not None and value != last.get(event):
+                    last[event] = value
+                    socketio.emit(event, json.loads(value))
+            socketio.sleep(interval)
+
+    if forward_events:
+        socketio.start_background_task(forward_stored_events)
+
+    # Build the first snapshot right away so the first request after a restart does not wait for it
+    socketio.start_background_task(cache.get)
 
     @app.route('/')
     def index():
-        proxies_list = load_working_proxies()
-        return render_template('index.html', proxies=proxies_list)
+        return render_template('index.html', proxies=cache.get().proxies)
+
+    def query_proxies():
+        filters = parse_filters(request.args)
+        sort, descending = parse_sort(request.args)
+        try:
+            limit = min(max(int(request.args.get('limit', 100)), 1), MAX_PAGE_SIZE)
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        after = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+
+        rows = db.query_proxies(ttl, filters, sort, descending, limit, after)
+        now = time.time()
+        response = jsonify([format_proxy(row, now) for row in rows])
+        if len(rows) == limit:
+            response.headers['X-Next-Cursor'] = encode_cursor(rows[-1], sort)
+        return response
 
     @app.route('/api/proxies', methods=['GET'])
     def get_proxies():
-        proxies_list = load_working_proxies()
-        return jsonify(proxies_list)
+        if any(key in request.args for key in QUERY_PARAMS):
+            try:
+                return query_proxies()
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+        snapshot = cache.get()
+        if request.if_none_match.contains(snapshot.etag):
+            response = Response(status=304)
+        elif 'gzip' in request.accept_encodings:
+            response = Response(snapshot.json_gzip, mimetype='application/json')
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(snapshot.json, mimetype='application/json')
+        response.set_etag(snapshot.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    @app.route('/api/proxies/export.<fmt>', methods=['GET'])
+    def export_proxies(fmt):
+        # Streams every matching proxy page by page, so memory use does not grow with the export size
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 404
+        try:
+            filters = parse_filters(request.args)
+            sort, descending = parse_sort(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with_scheme = len(filters.get('protocol', [])) != 1
+        chunks = export_chunks(db.iter_proxies(ttl, filters, sort, descending, EXPORT_CHUNK_ROWS), fmt, with_scheme)
+        if 'gzip' in request.accept_encodings:
+            response = Response(gzip_chunks(chunks), mimetype=EXPORT_FORMATS[fmt])
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response((chunk.encode() for chunk in chunks), mimetype=EXPORT_FORMATS[fmt])
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Content-Disposition'] = f'attachment; filename="proxies.{fmt}"'
+        return response
+
+    @app.route('/api/proxy', methods=['GET'])
+    def get_proxy():
+        strategy = request.args.get('strategy', 'best')
+        if strategy not in ('best', 'random'):
+            return jsonify({'error': "strategy must be 'best' or 'random'"}), 400
+        try:
+            filters = parse_filters(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        proxy = db.pick_proxy(ttl, filters, strategy)
+        if proxy is None:
+            return jsonify({'error': 'No matching proxy'}), 404
+        return jsonify(format_proxy(proxy, time.time()))
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        if 'request_start' in g:
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            API_REQUEST_DURATION.observe(time.perf_counter() - g.request_start, endpoint=endpoint,
+                                         method=request.method, status=str(response.status_code))
+        return response
+
+    @app.errorhandler(sqlite3.Error)
+    def database_unavailable(e):
+        # Readers return empty results on database errors; this covers the data version lookup,
+        # e.g. while the connection pool is exhausted
+        return jsonify({'error': 'Database temporarily unavailable'}), 503
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
     @app.route('/stat')
     def stat():